@@ -0,0 +1,243 @@
+"""
+Benchmarks of the cleaning and plotting pipeline on synthetic StatLine-shaped inputs.
+
+Every case runs in a fresh process, which reports its wall time and peak RSS. Results are appended as
+JSON lines, so runs can be compared with --compare.
+
+Usage (from the repository root):
+    python benchmarks/run_benchmarks.py --sizes 1e4 1e5 1e6 --output benchmarks/results.jsonl
+    python benchmarks/run_benchmarks.py --sizes 1e4 1e5 --compare benchmarks/results.jsonl
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+# The repository root for helper_functions and this directory for synthetic_statline, from any working directory
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.dirname(benchmarks_dir)
+sys.path.insert(0, repo_dir)
+sys.path.insert(0, benchmarks_dir)
+
+# Case name and the function that runs it on the cleaned data
+plot_cases = {
+    'barplotanimation': ('barplot_animation', 'barplotanimation', ('Trips_Per_Year', 'Trips per year')),
+    'plot_travelhours': ('function_travel_hours', 'plot_travelhours', ()),
+    'passenger_km_plot': ('passenger_km_time', 'passenger_km_plot', ()),
+    'passenger_prop_plot': ('passenger_km_time', 'passenger_prop_plot', ()),
+    'trips_per_year_total_and_period': ('functions_trips', 'trips_per_year_total_and_period', ()),
+    'trips_per_yearby_travel_mode_and_period': ('functions_trips', 'trips_per_yearby_travel_mode_and_period', ()),
+    'line_plot_trips': ('functions_trips', 'line_plot_trips', ()),
+    'area_chart_trips': ('functions_trips', 'area_chart_trips', ()),
+}
+
+
+def _peak_rss_mb():
+
+    """
+    Returns the peak resident set size of this process in MB.
+    """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(case, raw_path, cache_dir, shapefile_path=None):
+
+    """
+    Runs one benchmark case in the current process and returns its measurements.
+    """
+
+    import importlib
+
+    import matplotlib
+    matplotlib.use('Agg')
+
+    import pandas as pd
+
+    from helper_functions.aggregate_cube import build_cube
+    from helper_functions.data_cache import load_clean_dataset
+    from helper_functions.data_rename import make_named_clean_dataset, write_named_clean_dataset
+
+    # Prepare the input, outside the timed part
+    if case in ('clean_in_memory',):
+        data = pd.read_csv(raw_path, delimiter=';', encoding='utf-8')
+    elif case not in ('clean_chunked', 'read_csv', 'generate_map'):
+        data = load_clean_dataset(raw_path, cache_dir=cache_dir)
+
+    setup_rss = _peak_rss_mb()
+    rows_in = None
+    start = time.perf_counter()
+
+    if case == 'read_csv':
+        rows_in = len(pd.read_csv(raw_path, delimiter=';', encoding='utf-8'))
+    elif case == 'clean_in_memory':
+        rows_in = len(data)
+        make_named_clean_dataset(data)
+    elif case == 'clean_chunked':
+        write_named_clean_dataset(raw_path, os.path.join(cache_dir, 'benchmark_clean.csv'))
+    elif case == 'build_cube':
+        rows_in = len(data)
+        build_cube(data)
+    elif case == 'generate_map':
+        from helper_functions.map_maker import generate_map
+        generate_map(shapefile_path, show=False, cache_dir=os.path.join(cache_dir, 'map'))
+    else:
+        module_name, function_name, args = plot_cases[case]
+        function = getattr(importlib.import_module('helper_functions.' + module_name), function_name)
+        rows_in = len(data)
+        function(data, *args, show=False)
+
+    seconds = time.perf_counter() - start
+
+    return {'seconds': seconds, 'peak_rss_mb': _peak_rss_mb(), 'setup_rss_mb': setup_rss, 'rows_in': rows_in}
+
+
+def run_case_in_new_process(case, raw_path, cache_dir, shapefile_path=None):
+
+    """
+    Runs one case in a freshly spawned process, so its peak RSS is not influenced by earlier cases.
+    """
+
+    context = multiprocessing.get_context('spawn')
+
+    with context.Pool(1) as pool:
+        return pool.apply(run_case, (case, raw_path, cache_dir, shapefile_path))
+
+
+def _git_commit():
+
+    """
+    Returns the current git commit of the repository of this file, or None outside a git checkout.
+    """
+
+    try:
+        return subprocess.run(
+            ['git', '-C', repo_dir, 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes, work_dir, shapefile_path=None, max_in_memory_rows=10_000_000, cases=None):
+
+    """
+    Runs every case for every size and returns one result record per case and size.
+
+    Args:
+        sizes (list of int): Numbers of raw rows of the synthetic inputs.
+        work_dir (str): Directory for the synthetic raw files and the caches.
+        shapefile_path (str, optional): Gemeente shapefile, generate_map is only measured when given.
+        max_in_memory_rows (int): Largest size for which the in-memory cases (read_csv and
+            clean_in_memory) run, larger inputs do not fit in memory.
+        cases (list of str, optional): Only run these cases.
+
+    Returns:
+        list of dict: Result records.
+    """
+
+    from synthetic_statline import write_synthetic_raw
+
+    cache_dir = os.path.join(work_dir, 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    run_info = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+    results = []
+
+    for size in sizes:
+        raw_path = os.path.join(work_dir, f"synthetic_raw_{size}.csv")
+        if not os.path.exists(raw_path):
+            print(f"Generating {size} synthetic rows")
+            write_synthetic_raw(raw_path, size)
+
+        size_cases = ['clean_chunked', 'build_cube'] + list(plot_cases)
+        if size <= max_in_memory_rows:
+            size_cases = ['read_csv', 'clean_in_memory'] + size_cases
+        if shapefile_path is not None:
+            size_cases.append('generate_map')
+        if cases:
+            size_cases = [case for case in size_cases if case in cases]
+
+        for case in size_cases:
+            measurement = run_case_in_new_process(case, raw_path, cache_dir, shapefile_path)
+            record = dict(run_info, case=case, rows=size, **measurement)
+            results.append(record)
+            print(f"{case:45s} {size:>12,d} rows {record['seconds']:10.3f} s {record['peak_rss_mb']:10.1f} MB")
+
+    return results
+
+
+def compare_results(results, baseline_path, threshold=1.2):
+
+    """
+    Compares results with the latest earlier result of the same case and size in baseline_path.
+
+    Returns:
+        list of str: One line per case that became more than threshold times slower or bigger.
+    """
+
+    baseline = {}
+    with open(baseline_path, encoding='utf-8') as baseline_file:
+        for line in baseline_file:
+            record = json.loads(line)
+            baseline[(record['case'], record['rows'])] = record
+
+    regressions = []
+    for record in results:
+        previous = baseline.get((record['case'], record['rows']))
+        if previous is None:
+            continue
+        for metric in ['seconds', 'peak_rss_mb']:
+            ratio = record[metric] / previous[metric] if previous[metric] else 1.0
+            if ratio > threshold:
+                regressions.append(
+                    f"{record['case']} ({record['rows']:,d} rows): {metric} {previous[metric]:.3f} -> {record[metric]:.3f} ({ratio:.2f}x)"
+                )
+
+    return regressions
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', default=['1e4', '1e5', '1e6'], help="numbers of raw rows, 1e4 to 1e8")
+    parser.add_argument('--work-dir', default=os.path.join('benchmarks', 'work'), help="directory for the inputs")
+    parser.add_argument('--output', help="JSON lines file the results are appended to")
+    parser.add_argument('--compare', help="JSON lines file of an earlier run to compare with")
+    parser.add_argument('--threshold', type=float, default=1.2, help="slowdown ratio that counts as a regression")
+    parser.add_argument('--shapefile', help="gemeente shapefile, to also measure generate_map")
+    parser.add_argument('--cases', nargs='+', help="only run these cases")
+    arguments = parser.parse_args()
+
+    sizes = [int(float(size)) for size in arguments.sizes]
+    results = run_benchmarks(sizes, arguments.work_dir, arguments.shapefile, cases=arguments.cases)
+
+    # Compare before appending, so a run is never compared with itself
+    regressions = compare_results(results, arguments.compare, arguments.threshold) if arguments.compare else []
+
+    if arguments.output:
+        with open(arguments.output, 'a', encoding='utf-8') as output_file:
+            for record in results:
+                output_file.write(json.dumps(record) + '\n')
+
+    for regression in regressions:
+        print("REGRESSION", regression)
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Generates synthetic raw files in the shape of the CBS StatLine 84710ENG export, for the benchmarks.
+"""
+
+import numpy as np
+import pandas as pd
+
+from helper_functions.data_rename import (
+    column_names_mapping,
+    margins_mapping,
+    periods_mapping,
+    population_mapping,
+    region_char_mapping,
+    travel_modes_mapping,
+    travel_motives_mapping,
+)
+
+# Code vocabulary of every dimension column of the raw file
+code_vocabularies = {
+    'TravelMotives': list(travel_motives_mapping),
+    'Population': list(population_mapping),
+    'TravelModes': list(travel_modes_mapping),
+    'Margins': list(margins_mapping),
+    'RegionCharacteristics': list(region_char_mapping),
+    'Periods': list(periods_mapping),
+}
+
+# Raw names of the numeric columns and the range of their per day values
+raw_numeric_columns = [column for column in column_names_mapping if column not in code_vocabularies]
+
+
+def synthetic_chunk(n_rows, rng, first_id=0, missing_fraction=0.01):
+
+    """
+    Returns n_rows random raw rows, with codes drawn from the real vocabularies.
+
+    Args:
+        n_rows (int): Number of rows.
+        rng (np.random.Generator): Random generator.
+        first_id (int): 'ID' of the first row.
+        missing_fraction (float): Fraction of the numeric values that is written as '.', like CBS does.
+
+    Returns:
+        pd.DataFrame: Rows with the columns of the raw export.
+    """
+
+    chunk = {'ID': np.arange(first_id, first_id + n_rows)}
+
+    for column, codes in code_vocabularies.items():
+        chunk[column] = np.asarray(codes, dtype=object)[rng.integers(0, len(codes), n_rows)]
+
+    # Per day trips, distance and time, with the per year figures derived from them
+    trips = rng.uniform(0.1, 3.0, n_rows)
+    distance = trips * rng.uniform(2.0, 20.0, n_rows)
+    minutes = distance * rng.uniform(1.5, 4.0, n_rows)
+    values = [trips, distance, minutes, trips * 365, distance * 365, minutes * 365 / 60]
+
+    for column, column_values in zip(raw_numeric_columns, values):
+        column_values = np.round(column_values, 2).astype(object)
+        column_values[rng.random(n_rows) < missing_fraction] = '.'
+        chunk[column] = column_values
+
+    return pd.DataFrame(chunk)
+
+
+def write_synthetic_raw(path, n_rows, seed=0, chunk_rows=1_000_000):
+
+    """
+    Writes a synthetic raw StatLine file of n_rows rows, chunk by chunk so memory stays bounded.
+
+    Args:
+        path (str): Output path of the semicolon separated file.
+        n_rows (int): Number of rows.
+        seed (int): Seed of the random generator, the same seed gives the same file.
+        chunk_rows (int): Number of rows that are generated and written at once.
+
+    Returns:
+        str: path.
+    """
+
+    rng = np.random.default_rng(seed)
+    written = 0
+
+    while written < n_rows:
+        n_chunk = min(chunk_rows, n_rows - written)
+        chunk = synthetic_chunk(n_chunk, rng, first_id=written)
+        chunk.to_csv(path, sep=';', index=False, mode='w' if written == 0 else 'a', header=written == 0)
+        written += n_chunk
+
+    return path
@@ -0,0 +1,139 @@
+"""
+Helper functions of the mobility and urbanisation project of group 10.
+
+Importing the package is cheap: a submodule, and the libraries it needs (pandas, plotly, seaborn,
+geopandas, ...), is only imported the first time one of its functions is used, for example
+helper_functions.generate_map.
+"""
+
+import importlib
+from typing import TYPE_CHECKING
+
+# Public functions per submodule
+_submodule_functions = {
+    'aggregate_cube': ['AggregateCube', 'build_cube', 'as_cube', 'slice_cube', 'extend_cube'],
+    'barplot_animation': ['barplotanimation'],
+    'batch_render': ['save_figure', 'render_job', 'render_report', 'report_jobs'],
+    'chart_server': ['ChartServer', 'load_server_data', 'serve'],
+    'compact_figure': ['compact_animation', 'compact_figure_json', 'write_compact_html'],
+    'data_cache': ['cache_key', 'load_clean_dataset'],
+    'data_rename': [
+        'make_named_clean_dataset', 'iter_named_clean_chunks', 'write_named_clean_dataset',
+        'decode_period_code', 'decode_periods', 'concat_clean',
+    ],
+    'data_validation': ['ValidationReport', 'merge_reports', 'validate_dataset', 'validation_messages'],
+    'derived_metrics': ['add_derived_metrics', 'load_derived_cube'],
+    'error_bands': ['slice_with_bounds', 'add_plotly_error_bands', 'add_matplotlib_error_bands'],
+    'figure_cache': [
+        'data_fingerprint', 'cached_figure_json', 'configure_figure_cache', 'clear_figure_cache', 'figure_cache_info',
+    ],
+    'function_travel_hours': ['plot_travelhours'],
+    'functions_trips': [
+        'trips_per_year_total_and_period', 'trips_per_yearby_travel_mode_and_period', 'line_plot_trips',
+        'area_chart_trips', 'trips_report',
+    ],
+    'gemeente_loader': ['load_gemeenten'],
+    'gemeente_mobility': ['GemeenteMobility', 'join_mobility_to_gemeenten', 'mobility_frame'],
+    'incremental_ingest': ['load_store', 'stored_periods', 'ingest_new_periods'],
+    'instrumentation': [
+        'span', 'instrumented', 'enable_instrumentation', 'disable_instrumentation', 'clear_spans',
+        'recorded_spans', 'profile_summary', 'print_profile_summary', 'write_chrome_trace',
+    ],
+    'map_maker': ['build_simplified_geojson', 'generate_map', 'generate_mobility_map'],
+    'mobility_query': ['MobilityIndex', 'build_index', 'select_rows', 'query'],
+    'parallel_clean': ['clean_shard', 'clean_shards'],
+    'passenger_km_time': ['passenger_km_plot', 'passenger_prop_plot'],
+    'statline_metadata': [
+        'DimensionLookup', 'StatLineMetadata', 'compile_lookup', 'decode_with_lookup', 'read_statline_metadata',
+        'decode_statline_table',
+    ],
+}
+
+_submodule_by_name = {name: submodule for submodule, names in _submodule_functions.items() for name in names}
+
+__all__ = sorted(_submodule_by_name)
+
+
+def __getattr__(name):
+
+    """
+    Imports the submodule of a function, or the submodule itself, on first use.
+    """
+
+    if name in _submodule_functions:
+        return importlib.import_module('.' + name, __name__)
+
+    if name in _submodule_by_name:
+        value = getattr(importlib.import_module('.' + _submodule_by_name[name], __name__), name)
+        # Keep it, so the next lookup does not come here again
+        globals()[name] = value
+        return value
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+
+    return sorted(set(globals()) | set(__all__) | set(_submodule_functions))
+
+
+# Let type checkers and editors see the lazy names
+if TYPE_CHECKING:
+    from .aggregate_cube import AggregateCube, as_cube, build_cube, extend_cube, slice_cube
+    from .barplot_animation import barplotanimation
+    from .batch_render import render_job, render_report, report_jobs, save_figure
+    from .chart_server import ChartServer, load_server_data, serve
+    from .compact_figure import compact_animation, compact_figure_json, write_compact_html
+    from .data_cache import cache_key, load_clean_dataset
+    from .data_rename import (
+        concat_clean,
+        decode_period_code,
+        decode_periods,
+        iter_named_clean_chunks,
+        make_named_clean_dataset,
+        write_named_clean_dataset,
+    )
+    from .data_validation import ValidationReport, merge_reports, validate_dataset, validation_messages
+    from .derived_metrics import add_derived_metrics, load_derived_cube
+    from .error_bands import add_matplotlib_error_bands, add_plotly_error_bands, slice_with_bounds
+    from .figure_cache import (
+        cached_figure_json,
+        clear_figure_cache,
+        configure_figure_cache,
+        data_fingerprint,
+        figure_cache_info,
+    )
+    from .function_travel_hours import plot_travelhours
+    from .functions_trips import (
+        area_chart_trips,
+        line_plot_trips,
+        trips_per_year_total_and_period,
+        trips_per_yearby_travel_mode_and_period,
+        trips_report,
+    )
+    from .gemeente_loader import load_gemeenten
+    from .gemeente_mobility import GemeenteMobility, join_mobility_to_gemeenten, mobility_frame
+    from .incremental_ingest import ingest_new_periods, load_store, stored_periods
+    from .instrumentation import (
+        clear_spans,
+        disable_instrumentation,
+        enable_instrumentation,
+        instrumented,
+        print_profile_summary,
+        profile_summary,
+        recorded_spans,
+        span,
+        write_chrome_trace,
+    )
+    from .map_maker import build_simplified_geojson, generate_map, generate_mobility_map
+    from .mobility_query import MobilityIndex, build_index, query, select_rows
+    from .parallel_clean import clean_shard, clean_shards
+    from .passenger_km_time import passenger_km_plot, passenger_prop_plot
+    from .statline_metadata import (
+        DimensionLookup,
+        StatLineMetadata,
+        compile_lookup,
+        decode_statline_table,
+        decode_with_lookup,
+        read_statline_metadata,
+    )
@@ -0,0 +1,284 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .data_rename import bound_columns, numeric_columns, urbanisation_order
+from .instrumentation import instrumented
+
+# Dimensions of the cube, in the order of its axes
+cube_dimensions = ['TravelMotives', 'TravelModes', 'RegionCharacteristics', 'Period']
+
+# sums and counts have the shape motive x mode x region x period x measure,
+# labels holds the labels of every dimension axis and measures the names of the last axis
+AggregateCube = namedtuple('AggregateCube', ['sums', 'counts', 'labels', 'measures'])
+
+# Fixed label order of dimensions that are not stored as categoricals, for example after reading a csv
+dimension_orders = {'RegionCharacteristics': urbanisation_order}
+
+# Cubes of the DataFrames as_cube was called with, per data_fingerprint, the least recently used first
+_cubes = OrderedDict()
+_cubes_lock = threading.Lock()
+max_cached_cubes = 8
+
+
+def _dimension_codes(column, order=None):
+
+    """
+    Returns the integer codes and the labels of a dimension column, using the categories when it is categorical.
+    Otherwise the labels follow order when every value is in it, or are sorted. The column itself is never changed.
+    """
+
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy(), column.cat.categories
+
+    if order is not None:
+        codes = pd.Categorical(column, categories=order).codes
+        if not ((codes < 0) & column.notna().to_numpy()).any():
+            return codes, pd.Index(order)
+
+    codes, labels = pd.factorize(column, sort=True)
+
+    return codes, labels
+
+
+@instrumented
+def build_cube(data):
+
+    """
+    Aggregates the cleaned mobility data once into a motive x mode x region x period x measure cube.
+
+    Args:
+        data (pd.DataFrame): Cleaned DataFrame with 'TravelMotives', 'TravelModes', 'RegionCharacteristics',
+            'Period' and the numeric measure columns.
+
+    Returns:
+        AggregateCube: Per cell the sum and the number of non-missing rows of every measure.
+
+    Notes:
+        - Only rows of 'Population 6 years or older' with 'Value' margins are used, when those columns exist.
+        - The measures are the numeric columns of make_named_clean_dataset that are present in data,
+          including the confidence interval bound columns.
+        - Every cell is filled in a single np.bincount pass per measure over the rows.
+        - data is only read, never modified or copied, so one DataFrame can be shared by several threads.
+    """
+
+    # Only keep the values of the population of 6 years and older, like the cleaning step
+    mask = np.ones(len(data), dtype=bool)
+    if 'Population' in data.columns:
+        mask &= (data['Population'] == 'Population 6 years or older').to_numpy()
+    if 'Margins' in data.columns:
+        mask &= (data['Margins'] == 'Value').to_numpy()
+
+    # Turn every dimension into integer codes
+    codes = []
+    labels = {}
+    for dimension in cube_dimensions:
+        dimension_codes, dimension_labels = _dimension_codes(data[dimension], dimension_orders.get(dimension))
+        codes.append(dimension_codes)
+        labels[dimension] = dimension_labels
+        mask &= dimension_codes >= 0
+
+    shape = tuple(len(labels[dimension]) for dimension in cube_dimensions)
+    measures = [column for column in numeric_columns + bound_columns if column in data.columns]
+
+    # Flat cell number of every row, rows that are not used go to cell 0 with a weight of 0
+    cells = np.ravel_multi_index([np.where(mask, dimension_codes, 0) for dimension_codes in codes], shape)
+    n_cells = int(np.prod(shape))
+
+    sums = np.zeros((n_cells, len(measures)))
+    counts = np.zeros((n_cells, len(measures)))
+
+    # Sum every measure per cell, skipping missing values like pandas does
+    for i, measure in enumerate(measures):
+        values = data[measure].to_numpy(dtype=float)
+        valid = mask & ~np.isnan(values)
+        sums[:, i] = np.bincount(cells, weights=np.where(valid, values, 0.0), minlength=n_cells)
+        counts[:, i] = np.bincount(cells, weights=valid, minlength=n_cells)
+
+    return AggregateCube(
+        sums=sums.reshape(shape + (len(measures),)),
+        counts=counts.reshape(shape + (len(measures),)),
+        labels=labels,
+        measures=measures,
+    )
+
+
+@instrumented
+def as_cube(data):
+
+    """
+    Returns data when it already is an AggregateCube, otherwise the cube of the DataFrame.
+    The cube of a DataFrame is built once and reused while its values stay the same, so the helpers can be
+    called one after another on the same DataFrame without aggregating it every time.
+    """
+
+    from .figure_cache import data_fingerprint
+
+    if isinstance(data, AggregateCube):
+        return data
+
+    key = data_fingerprint(data)
+    with _cubes_lock:
+        if key in _cubes:
+            _cubes.move_to_end(key)
+            return _cubes[key]
+
+    cube = build_cube(data)
+
+    with _cubes_lock:
+        _cubes[key] = cube
+        while len(_cubes) > max_cached_cubes:
+            _cubes.popitem(last=False)
+
+    return cube
+
+
+def _label_positions(labels, values):
+
+    """
+    Returns the positions of one label or a list of labels on a cube axis.
+    """
+
+    if isinstance(values, (list, tuple, set, np.ndarray, pd.Index)):
+        values = list(values)
+    else:
+        values = [values]
+
+    positions = labels.get_indexer(pd.Index(values))
+
+    return positions[positions >= 0]
+
+
+@instrumented
+def slice_cube(cube, measure, by, where=None, exclude=None, statistic='sum'):
+
+    """
+    Slices one measure out of the cube, aggregated over every dimension that is not in by.
+
+    Args:
+        cube (AggregateCube): Cube made by build_cube.
+        measure (str): Name of the measure, for example 'Trips_Per_Year'.
+        by (list of str): Dimensions that are kept, in the order of the output columns.
+        where (dict, optional): Per dimension the label or labels that are kept.
+        exclude (dict, optional): Per dimension the label or labels that are left out.
+        statistic (str): 'sum' for the sum of the rows of every group, 'mean' for their average. The
+            ratio measures of add_derived_metrics are always averaged.
+
+    Returns:
+        pd.DataFrame: One row per group that has data, with the by columns as ordered categoricals and
+            the aggregated measure, sorted in the order of the cube labels like a groupby.
+    """
+
+    from .derived_metrics import _is_derived_measure
+
+    # Ratios per cell, such as km per trip, can not be summed over cells
+    if _is_derived_measure(measure):
+        statistic = 'mean'
+
+    measure_index = cube.measures.index(measure)
+    sums = cube.sums[..., measure_index]
+    counts = cube.counts[..., measure_index]
+
+    # Select the labels that are kept on every axis
+    selections = []
+    for dimension in cube_dimensions:
+        positions = np.arange(len(cube.labels[dimension]))
+        if where and dimension in where:
+            positions = _label_positions(cube.labels[dimension], where[dimension])
+        if exclude and dimension in exclude:
+            positions = np.setdiff1d(positions, _label_positions(cube.labels[dimension], exclude[dimension]))
+        selections.append(positions)
+
+    selector = np.ix_(*selections)
+    sums = sums[selector]
+    counts = counts[selector]
+
+    # Sum over the dimensions that are not kept and put the kept ones in the order of by
+    summed_axes = tuple(axis for axis, dimension in enumerate(cube_dimensions) if dimension not in by)
+    kept_axes = [cube_dimensions.index(dimension) for dimension in by]
+    order = np.argsort(np.argsort(kept_axes))
+    sums = sums.sum(axis=summed_axes).transpose(order)
+    counts = counts.sum(axis=summed_axes).transpose(order)
+
+    # Only keep the groups that have data
+    found = np.nonzero(counts > 0)
+
+    if statistic == 'mean':
+        values = sums[found] / counts[found]
+    else:
+        values = sums[found]
+
+    result = {}
+    for dimension, positions in zip(by, found):
+        labels = cube.labels[dimension]
+        axis_positions = selections[cube_dimensions.index(dimension)]
+        group_labels = pd.Categorical.from_codes(axis_positions[positions], categories=labels, ordered=True)
+        result[dimension] = group_labels.remove_unused_categories()
+    result[measure] = values
+
+    return pd.DataFrame(result)
+
+
+@instrumented
+def extend_cube(cube, new_data):
+
+    """
+    Adds the periods of newly cleaned data to an existing cube, without aggregating the old rows again.
+
+    Args:
+        cube (AggregateCube): Cube of the data that was already processed.
+        new_data (pd.DataFrame or AggregateCube): Cleaned rows of periods that are not yet in cube.
+
+    Returns:
+        AggregateCube: The cube with the new periods appended to its period axis.
+
+    Raises:
+        ValueError: When new_data has a period that is already in cube, other measures or labels that
+            are not in cube.
+
+    Notes:
+        - A cube of add_derived_metrics is extended on its base measures and its derived measures are
+          computed again, as the change measures of the new periods depend on the old ones.
+    """
+
+    from .derived_metrics import _base_cube, _baseline_period, _is_derived_measure, add_derived_metrics
+
+    if any(_is_derived_measure(name) for name in cube.measures):
+        extended = extend_cube(_base_cube(cube), _base_cube(as_cube(new_data)))
+        return add_derived_metrics(extended, baseline_period=_baseline_period(cube))
+
+    new_cube = _base_cube(as_cube(new_data))
+
+    if cube.measures != new_cube.measures:
+        raise ValueError("The measures of the new data differ from the cube")
+
+    # Only the period axis may grow, the other labels of the new data are placed on the axes of the cube
+    positions = []
+    for dimension in cube_dimensions[:-1]:
+        dimension_positions = cube.labels[dimension].get_indexer(new_cube.labels[dimension])
+        if (dimension_positions < 0).any():
+            raise ValueError(f"The new data has {dimension} labels that are not in the cube")
+        positions.append(dimension_positions)
+    positions += [np.arange(len(new_cube.labels['Period'])), np.arange(len(cube.measures))]
+
+    shape = cube.sums.shape[:3] + new_cube.sums.shape[3:]
+    new_sums = np.zeros(shape)
+    new_counts = np.zeros(shape)
+    new_sums[np.ix_(*positions)] = new_cube.sums
+    new_counts[np.ix_(*positions)] = new_cube.counts
+
+    overlap = cube.labels['Period'].intersection(new_cube.labels['Period'])
+    if len(overlap) > 0:
+        raise ValueError(f"Periods already in the cube: {list(overlap)}")
+
+    labels = dict(cube.labels)
+    labels['Period'] = cube.labels['Period'].append(new_cube.labels['Period'])
+
+    return AggregateCube(
+        sums=np.concatenate([cube.sums, new_sums], axis=3),
+        counts=np.concatenate([cube.counts, new_counts], axis=3),
+        labels=labels,
+        measures=cube.measures,
+    )
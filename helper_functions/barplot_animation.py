@@ -1,35 +1,41 @@
-import plotly.express as px
-import pandas as pd
+from .aggregate_cube import as_cube, slice_cube
+from .compact_figure import compact_animation
+from .data_rename import urbanisation_order
+from .instrumentation import instrumented
 
-def barplotanimation(dataset, column, yaxis_name):
+@instrumented
+def barplotanimation(dataset, column, yaxis_name, exclude_modes=None, show=True, compact=False):
     
     """
     Creates an animated bar plot to show data by urbanization level and travel mode over time.
 
     Args:
-        dataset (pd.DataFrame): DataFrame with columns 'RegionCharacteristics', 'TravelModes', 'Period', 
-            and the specified column for the y-axis.
+        dataset (pd.DataFrame or AggregateCube): DataFrame with columns 'RegionCharacteristics', 'TravelModes',
+            'Period', and the specified column for the y-axis, or a cube made from it by build_cube.
         column (str): Column name to display on the y-axis.
         yaxis_name (str): Label for the y-axis.
+        exclude_modes (list of str, optional): Travel modes to leave out, for example ['Total'] when the
+            dataset still contains the totals.
+        show (bool): Display the animation instead of returning the figure.
+        compact (bool): Only store the values that change in the animation frames, with compact_animation,
+            which makes the figure JSON about a third smaller.
 
     Returns:
-        None: Displays an animated bar plot with play and pause controls.
+        plotly.graph_objects.Figure: An animated bar plot with play and pause controls.
 
+    Notes:
+        - dataset is never modified or copied, the urbanisation order comes from the aggregate cube, so
+          the function can be called from several threads on the same DataFrame.
     """
 
-    # Define the correct order for 'RegionCharacteristics'
-    urbanization_order = ['Not urbanised', 'Hardly urbanised', 'Moderately urbanised', 'Strongly urbanised', 'Extremely urbanised']
+    import plotly.express as px
 
-    # Ensure 'RegionCharacteristics' follows this order
-    dataset.loc[:, 'RegionCharacteristics'] = pd.Categorical(
-        dataset['RegionCharacteristics'], 
-        categories=urbanization_order, 
-        ordered=True
+    # Sum per RegionCharacteristics, TravelModes and Period from the aggregate cube
+    kmtot = slice_cube(
+        as_cube(dataset), column, by=['RegionCharacteristics', 'TravelModes', 'Period'],
+        exclude={'TravelModes': exclude_modes} if exclude_modes else None
     )
 
-    # Group by RegionCharacteristics and TravelModes, and sum the distances
-    kmtot = dataset.groupby(['RegionCharacteristics', 'TravelModes', 'Period'])[column].sum().reset_index()
-
 
     # Create the bar plot
     fig = px.bar(data_frame=kmtot,
@@ -38,7 +44,7 @@ def barplotanimation(dataset, column, yaxis_name):
                 color='TravelModes',  # Different colors for each travel mode
                 barmode='group',
                 animation_frame = "Period",
-                category_orders={"RegionCharacteristics": urbanization_order},  # Explicitly set category order
+                category_orders={"RegionCharacteristics": urbanisation_order},  # Explicitly set category order
                 labels={column: yaxis_name,
                         'RegionCharacteristics': 'Urbanization level'},  # Custom y-axis label                
                 )  # Order categories)  # Group bars next to each other
@@ -64,5 +70,13 @@ def barplotanimation(dataset, column, yaxis_name):
     }]
     )
 
+    # Keep only the changing values in the frames
+    if compact:
+        fig = compact_animation(fig)
+
     # Show the plot
-    fig.show()
\ No newline at end of file
+    if show:
+        fig.show()
+        return None
+
+    return fig
\ No newline at end of file
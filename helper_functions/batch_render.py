@@ -0,0 +1,200 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from . import instrumentation
+from .instrumentation import _merge_spans, _traced_call, instrumented
+
+# Formats that plotly and matplotlib figures can be written to
+plotly_formats = ['html', 'png', 'svg', 'pdf']
+matplotlib_formats = ['png', 'svg', 'pdf']
+
+
+def _init_worker():
+
+    """
+    Makes a worker process headless, so matplotlib never needs a display.
+    """
+
+    os.environ['MPLBACKEND'] = 'Agg'
+
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+@instrumented
+def save_figure(fig, path_without_extension, formats=('html',)):
+
+    """
+    Writes one plotly or matplotlib figure to disk in every requested format it supports.
+
+    Args:
+        fig (plotly.graph_objects.Figure or matplotlib.figure.Figure): Figure returned by a helper function.
+        path_without_extension (str): Output path, the extension of every format is appended to it.
+        formats (iterable of str): Formats to write, out of 'html', 'png', 'svg' and 'pdf'.
+
+    Returns:
+        list of str: Paths of the written files.
+
+    Notes:
+        - Plotly figures are written as standalone html that loads plotly.js from the CDN, static
+          images of plotly figures need the kaleido package.
+        - Matplotlib figures are written to html as an inline svg. The figure is closed after saving
+          so it does not stay in pyplot's memory.
+    """
+
+    paths = []
+
+    # Matplotlib figures have savefig, plotly figures have write_html
+    if hasattr(fig, 'savefig'):
+        import matplotlib.pyplot as plt
+
+        for file_format in formats:
+            path = path_without_extension + '.' + file_format
+            if file_format in matplotlib_formats:
+                fig.savefig(path, format=file_format, bbox_inches='tight')
+            elif file_format == 'html':
+                svg = io.StringIO()
+                fig.savefig(svg, format='svg', bbox_inches='tight')
+                with open(path, 'w', encoding='utf-8') as html_file:
+                    html_file.write('<!DOCTYPE html>\n<html><body>\n' + svg.getvalue() + '\n</body></html>\n')
+            else:
+                continue
+            paths.append(path)
+        plt.close(fig)
+
+    else:
+        for file_format in formats:
+            if file_format not in plotly_formats:
+                continue
+            path = path_without_extension + '.' + file_format
+            if file_format == 'html':
+                fig.write_html(path, include_plotlyjs='cdn')
+            else:
+                fig.write_image(path, format=file_format)
+            paths.append(path)
+
+    return paths
+
+
+@instrumented
+def render_job(job, output_dir, formats=('html',)):
+
+    """
+    Builds the figure or figures of one job without showing them and writes them to output_dir.
+
+    Args:
+        job (tuple): (name, function, args, kwargs) with a helper function and the arguments to call it with.
+        output_dir (str): Directory the files are written to.
+        formats (iterable of str): Formats to write, see save_figure.
+
+    Returns:
+        list of str: Paths of the written files.
+    """
+
+    name, function, args, kwargs = job
+    figures = function(*args, show=False, **kwargs)
+
+    # plot_travelhours returns more than one figure, number those
+    if not isinstance(figures, tuple):
+        return save_figure(figures, os.path.join(output_dir, name), formats)
+
+    paths = []
+    for number, fig in enumerate(figures, start=1):
+        paths += save_figure(fig, os.path.join(output_dir, f"{name}_{number}"), formats)
+
+    return paths
+
+
+@instrumented
+def render_report(jobs, output_dir, formats=('html',), max_workers=None):
+
+    """
+    Renders all figures of a report headless and in parallel over a process pool.
+
+    Args:
+        jobs (list of tuple): (name, function, args, kwargs) per figure, for example from report_jobs.
+        output_dir (str): Directory the files are written to, it is created when it does not exist.
+        formats (iterable of str): Formats to write, out of 'html', 'png', 'svg' and 'pdf'.
+        max_workers (int, optional): Number of worker processes, defaults to the number of cores.
+
+    Returns:
+        dict: Per job name the list of written file paths, in the order of jobs.
+
+    Notes:
+        - Every worker uses the Agg backend, so no display is needed.
+        - The arguments of every job are sent to a worker, pass an AggregateCube instead of the full
+          DataFrame to keep that cheap.
+        - While instrumentation is enabled, the spans of every worker are sent back with its files and
+          added to the spans of this process.
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+    formats = tuple(formats)
+
+    traced, memory = instrumentation.enabled, instrumentation.trace_memory
+    paths = {}
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+        futures = [executor.submit(_traced_call, traced, memory, render_job, job, output_dir, formats) for job in jobs]
+        for job, future in zip(jobs, futures):
+            paths[job[0]], spans = future.result()
+            _merge_spans(spans)
+
+    return paths
+
+
+@instrumented
+def report_jobs(data, shapefile_path=None, trips_grid=False):
+
+    """
+    Lists the jobs of the figures in project_group_10.ipynb, to be used with render_report.
+
+    Args:
+        data (pd.DataFrame or AggregateCube): The cleaned mobility data, or a cube made from it by build_cube.
+        shapefile_path (str, optional): Path to the gemeente shapefile, the map is only rendered when given.
+        trips_grid (bool): Render the four trips charts as one figure with trips_report, instead of four figures.
+
+    Returns:
+        list of tuple: (name, function, args, kwargs) per figure.
+    """
+
+    from .aggregate_cube import as_cube
+    from .barplot_animation import barplotanimation
+    from .function_travel_hours import plot_travelhours
+    from .functions_trips import (
+        area_chart_trips,
+        line_plot_trips,
+        trips_per_year_total_and_period,
+        trips_per_yearby_travel_mode_and_period,
+        trips_report,
+    )
+    from .map_maker import generate_map
+    from .passenger_km_time import passenger_km_plot, passenger_prop_plot
+
+    # Aggregate once, the workers only receive the small cube
+    cube = as_cube(data)
+    no_total = {'exclude_modes': ['Total']}
+
+    jobs = [
+        ('travel_hours', plot_travelhours, (cube,), {}),
+        ('barplot_time_travelled', barplotanimation, (cube, 'Time_Travelled_Hours_Per_Year', 'Time travelled (hours/year)'), no_total),
+        ('passenger_km', passenger_km_plot, (cube,), {}),
+        ('passenger_km_proportion', passenger_prop_plot, (cube,), {}),
+        ('barplot_distance_travelled', barplotanimation, (cube, 'Distance_Travelled_PassengerKm_Per_Year', 'Distance travelled (km/year)'), no_total),
+        ('trips_total', trips_per_year_total_and_period, (cube,), {}),
+        ('trips_by_travel_mode', trips_per_yearby_travel_mode_and_period, (cube,), {}),
+        ('trips_line', line_plot_trips, (cube,), {}),
+        ('barplot_trips', barplotanimation, (cube, 'Trips_Per_Year', 'Trips per year'), no_total),
+        ('trips_area', area_chart_trips, (cube,), {}),
+    ]
+
+    # One grid figure instead of the four separate trips figures
+    if trips_grid:
+        trips_jobs = {'trips_total', 'trips_by_travel_mode', 'trips_line', 'trips_area'}
+        jobs = [job for job in jobs if job[0] not in trips_jobs] + [('trips_report', trips_report, (cube,), {})]
+
+    if shapefile_path is not None:
+        jobs.append(('urbanisation_map', generate_map, (shapefile_path,), {}))
+
+    return jobs
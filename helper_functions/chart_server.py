@@ -0,0 +1,451 @@
+"""
+Local HTTP server for the mobility charts and aggregates, built on asyncio and the standard library.
+
+Run it from the repository root with:
+    python -m helper_functions.chart_server --clean values_named_clean_mobility_data.csv --port 8050
+
+Endpoints (every response is JSON):
+    /health                  Status and number of rows.
+    /dimensions              Labels of every dimension and the measures.
+    /aggregate?measure=...   One measure aggregated per group, see _aggregate_request for the parameters.
+    /trips?mode=Bike&region=Strongly urbanised
+                             /aggregate of 'Trips_Per_Year' per period, of the 'Total' motive.
+    /figure/<name>?...       Plotly figure spec of a plotly helper, for example /figure/passenger_km_plot.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from .instrumentation import instrumented
+
+# Query parameter of every dimension
+dimension_parameters = {
+    'motive': 'TravelMotives',
+    'mode': 'TravelModes',
+    'region': 'RegionCharacteristics',
+    'period': 'Period',
+}
+
+# Label of the total of every dimension that has one, the rows of the total hold the sum of the other labels
+dimension_totals = {
+    'TravelMotives': 'Total',
+    'TravelModes': 'Total',
+    'RegionCharacteristics': 'The Netherlands',
+}
+
+# Plotly helpers that can be served, per name its module and the query parameters it accepts
+figure_functions = {
+    'barplotanimation': ('barplot_animation', ['column', 'yaxis_name', 'exclude_mode']),
+    'plot_travelhours': ('function_travel_hours', []),
+    'passenger_km_plot': ('passenger_km_time', ['measure']),
+    'passenger_prop_plot': ('passenger_km_time', ['measure']),
+}
+
+# Cube of the worker processes, set once by _init_figure_worker
+_worker_cube = None
+
+
+class _HttpError(Exception):
+
+    """
+    Error that is sent to the client with its status code.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _init_figure_worker(cube):
+
+    """
+    Makes a worker process headless and keeps the cube in it, so it is sent to every worker only once.
+    """
+
+    global _worker_cube
+
+    from .batch_render import _init_worker
+
+    _init_worker()
+    _worker_cube = cube
+
+
+def _build_figure_json(name, kwargs):
+
+    """
+    Builds the plotly JSON of a figure in a worker process, repeated figures come from its figure cache.
+    """
+
+    import importlib
+    from .figure_cache import cached_figure_json
+
+    function = getattr(importlib.import_module('.' + figure_functions[name][0], __package__), name)
+
+    return cached_figure_json(function, _worker_cube, **kwargs)
+
+
+@instrumented
+def load_server_data(clean_path=None, raw_path=None, cache_dir="cache"):
+
+    """
+    Loads the cleaned mobility data for the server.
+
+    Args:
+        clean_path (str, optional): Cleaned csv, for example 'values_named_clean_mobility_data.csv'.
+        raw_path (str, optional): Raw StatLine export, cleaned through load_clean_dataset and its cache.
+        cache_dir (str): Cache directory of load_clean_dataset.
+
+    Returns:
+        pd.DataFrame: The cleaned data, the dimension columns of a csv are read as text so every label,
+            including the years, matches the query parameters.
+    """
+
+    import pandas as pd
+    from .aggregate_cube import cube_dimensions
+
+    if raw_path is not None:
+        from .data_cache import load_clean_dataset
+        return load_clean_dataset(raw_path, cache_dir=cache_dir)
+
+    return pd.read_csv(clean_path, dtype={dimension: str for dimension in cube_dimensions})
+
+
+class ChartServer:
+
+    """
+    Serves aggregates and plotly figure specs of one cleaned dataset that is loaded once.
+
+    Args:
+        data (pd.DataFrame): Cleaned mobility data.
+        workers (int, optional): Number of worker processes that build figures, defaults to the number of CPUs.
+        max_pending (int): Maximum number of different requests that are computed at the same time, more
+            get a 503 so the latency of the accepted requests stays bounded.
+        cache_entries (int): Number of finished responses that are kept, the data never changes while
+            the server runs so they stay valid.
+        keep_alive_timeout (float): Seconds an idle keep-alive connection stays open.
+
+    Notes:
+        - The aggregate cube and the row index are built once at startup. Aggregates are computed in the
+          default thread pool, figures in a process pool whose workers receive the cube once.
+        - Identical requests that arrive while the first one is still computed wait for the same result,
+          the work is done once.
+        - The workers are spawned, so a script that starts the server needs an if __name__ == '__main__' guard.
+    """
+
+    def __init__(self, data, workers=None, max_pending=256, cache_entries=256, keep_alive_timeout=15.0):
+        from .aggregate_cube import build_cube
+        from .mobility_query import build_index
+
+        self.cube = build_cube(data)
+        self.index = build_index(data)
+        self.rows = len(data)
+        self.max_pending = max_pending
+        self.cache_entries = cache_entries
+        self.keep_alive_timeout = keep_alive_timeout
+        self.stats = {'requests': 0, 'computed': 0, 'coalesced': 0, 'cached': 0, 'rejected': 0}
+
+        # Spawn the workers, forking a process that already runs threads can deadlock them
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_figure_worker,
+            initargs=(self.cube,),
+        )
+        self._inflight = {}
+        self._responses = OrderedDict()
+
+    async def _coalesced(self, key, executor, function, *args):
+
+        """
+        Runs function in executor once per key, callers with a key that is already running share its result.
+        """
+
+        if key in self._responses:
+            self._responses.move_to_end(key)
+            self.stats['cached'] += 1
+            return self._responses[key]
+
+        future = self._inflight.get(key)
+
+        if future is None:
+            if len(self._inflight) >= self.max_pending:
+                self.stats['rejected'] += 1
+                raise _HttpError(HTTPStatus.SERVICE_UNAVAILABLE, "Too many requests in progress, retry later")
+
+            future = asyncio.get_running_loop().run_in_executor(executor, function, *args)
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._finish(key, done))
+            self.stats['computed'] += 1
+        else:
+            self.stats['coalesced'] += 1
+
+        # A client that disconnects must not cancel the work other clients wait for
+        return await asyncio.shield(future)
+
+    def _finish(self, key, future):
+
+        """
+        Removes a finished request from the running ones and keeps its response when it succeeded.
+        """
+
+        self._inflight.pop(key, None)
+
+        if not future.cancelled() and future.exception() is None:
+            self._responses[key] = future.result()
+            while len(self._responses) > self.cache_entries:
+                self._responses.popitem(last=False)
+
+    def _filters(self, parameters):
+
+        """
+        Reads the where and exclude filters from the query parameters, for example mode=Bike&exclude_region=...
+        """
+
+        where = {}
+        exclude = {}
+
+        for parameter, dimension in dimension_parameters.items():
+            for filters, name in [(where, parameter), (exclude, 'exclude_' + parameter)]:
+                if name not in parameters:
+                    continue
+                unknown = set(parameters[name]) - set(self.index.labels[dimension].astype(str))
+                if unknown:
+                    raise _HttpError(HTTPStatus.BAD_REQUEST, f"Unknown {parameter}: {sorted(unknown)}")
+                filters[dimension] = parameters[name]
+
+        return where, exclude
+
+    def _aggregate(self, measure, by, where, exclude, statistic):
+
+        """
+        Computes one aggregate and encodes it as JSON, runs in a thread of the default pool.
+        """
+
+        from .mobility_query import query
+
+        frame = query(self.index, measure, by=by, where=where, exclude=exclude, statistic=statistic)
+        records = frame.astype({dimension: str for dimension in by}).to_dict('records')
+
+        return json.dumps({'measure': measure, 'by': by, 'statistic': statistic, 'records': records})
+
+    async def _aggregate_request(self, parameters, measure=None, by=None):
+
+        """
+        Handles /aggregate and /trips.
+
+        Query parameters:
+            measure: Measure column, for example 'Trips_Per_Year'.
+            by: Dimension to group by, repeat it for several, as dimension name or as motive, mode,
+                region or period. Defaults to period.
+            motive, mode, region, period: Label that is kept, repeat it to keep several.
+            exclude_motive, exclude_mode, exclude_region, exclude_period: Label that is left out.
+            statistic: 'sum' (default) or 'mean'.
+
+        A dimension that has a total label, 'Total' for motives and modes, and that is not in by and has
+        no motive, mode or region or exclude filter, is filtered on its total. Otherwise the total rows
+        would be added to the rows they are the total of.
+        """
+
+        measure = parameters.get('measure', [measure])[0]
+        if measure not in self.cube.measures:
+            raise _HttpError(HTTPStatus.BAD_REQUEST, f"Unknown measure: {measure}, choose from {self.cube.measures}")
+
+        by = [dimension_parameters.get(dimension, dimension) for dimension in parameters.get('by', by or ['period'])]
+        unknown = [dimension for dimension in by if dimension not in dimension_parameters.values()]
+        if unknown:
+            raise _HttpError(HTTPStatus.BAD_REQUEST, f"Unknown dimensions: {unknown}")
+
+        statistic = parameters.get('statistic', ['sum'])[0]
+        if statistic not in ('sum', 'mean'):
+            raise _HttpError(HTTPStatus.BAD_REQUEST, "statistic must be 'sum' or 'mean'")
+
+        where, exclude = self._filters(parameters)
+
+        # Use the total of every dimension that is not grouped or filtered, so nothing is counted twice
+        for dimension, total in dimension_totals.items():
+            unfiltered = dimension not in by and dimension not in where and dimension not in exclude
+            if unfiltered and total in self.index.labels[dimension]:
+                where[dimension] = [total]
+
+        key = ('aggregate', measure, tuple(by), repr(sorted(where.items())), repr(sorted(exclude.items())), statistic)
+
+        return await self._coalesced(key, None, self._aggregate, measure, by, where, exclude, statistic)
+
+    async def _figure_request(self, name, parameters):
+
+        """
+        Handles /figure/<name>, the figure is built in the process pool.
+        """
+
+        if name not in figure_functions:
+            raise _HttpError(HTTPStatus.NOT_FOUND, f"Unknown figure: {name}, choose from {sorted(figure_functions)}")
+
+        accepted = figure_functions[name][1]
+        kwargs = {}
+        for parameter in accepted:
+            if parameter == 'exclude_mode' and parameter in parameters:
+                kwargs['exclude_modes'] = parameters[parameter]
+            elif parameter in parameters:
+                kwargs[parameter] = parameters[parameter][0]
+
+        if name == 'barplotanimation':
+            kwargs['compact'] = True
+            kwargs.setdefault('column', 'Trips_Per_Year')
+            kwargs.setdefault('yaxis_name', kwargs['column'].replace('_', ' '))
+            if kwargs['column'] not in self.cube.measures:
+                raise _HttpError(HTTPStatus.BAD_REQUEST, f"Unknown column: {kwargs['column']}")
+        if 'measure' in kwargs and kwargs['measure'] not in self.cube.measures:
+            raise _HttpError(HTTPStatus.BAD_REQUEST, f"Unknown measure: {kwargs['measure']}")
+
+        key = ('figure', name, repr(sorted(kwargs.items())))
+
+        return await self._coalesced(key, self._executor, _build_figure_json, name, kwargs)
+
+    async def respond(self, method, target):
+
+        """
+        Returns the status and JSON body of one request.
+        """
+
+        if method not in ('GET', 'HEAD'):
+            raise _HttpError(HTTPStatus.METHOD_NOT_ALLOWED, "Only GET is supported")
+
+        url = urlsplit(target)
+        path = unquote(url.path).rstrip('/') or '/'
+        parameters = parse_qs(url.query)
+
+        if path == '/health':
+            return json.dumps({'status': 'ok', 'rows': self.rows, **self.stats})
+        if path == '/dimensions':
+            labels = {dimension: [str(label) for label in labels] for dimension, labels in self.index.labels.items()}
+            return json.dumps({'dimensions': labels, 'measures': self.cube.measures})
+        if path in ('/aggregate', '/trips'):
+            return await self._aggregate_request(parameters, measure='Trips_Per_Year')
+        if path.startswith('/figure/'):
+            return await self._figure_request(path[len('/figure/'):], parameters)
+
+        raise _HttpError(HTTPStatus.NOT_FOUND, f"Unknown path: {path}")
+
+    async def handle_connection(self, reader, writer):
+
+        """
+        Serves the requests of one connection, keeping it open between requests for HTTP/1.1 clients.
+        """
+
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self.keep_alive_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+
+                # Read the headers up to the empty line
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                self.stats['requests'] += 1
+                parts = request_line.decode('latin-1').split()
+                version = parts[2] if len(parts) == 3 else 'HTTP/1.0'
+
+                try:
+                    if len(parts) != 3:
+                        raise _HttpError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+                    body = await self.respond(parts[0], parts[1])
+                    status = HTTPStatus.OK
+                except _HttpError as error:
+                    status, body = error.status, json.dumps({'error': str(error)})
+                except Exception as error:
+                    status, body = HTTPStatus.INTERNAL_SERVER_ERROR, json.dumps({'error': repr(error)})
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' or (version == 'HTTP/1.1' and connection != 'close')
+
+                payload = body.encode('utf-8')
+                head = (
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    "Access-Control-Allow-Origin: *\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                )
+                writer.write(head.encode('latin-1') + (b'' if parts[:1] == ['HEAD'] else payload))
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self, host='127.0.0.1', port=8050):
+
+        """
+        Listens on host and port until the task is cancelled, then shuts the worker pool down.
+        """
+
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+        print(f"Serving {self.rows} rows on http://{host}:{port}\n")
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+
+        """
+        Shuts the worker pool down.
+        """
+
+        self._executor.shutdown(cancel_futures=True)
+
+
+def serve(data, host='127.0.0.1', port=8050, workers=None):
+
+    """
+    Runs a ChartServer for data until it is interrupted.
+
+    Args:
+        data (pd.DataFrame): Cleaned mobility data, for example from load_server_data.
+        host (str): Address to listen on, only the local machine by default.
+        port (int): Port to listen on.
+        workers (int, optional): Number of worker processes that build figures.
+    """
+
+    try:
+        asyncio.run(ChartServer(data, workers=workers).serve_forever(host, port))
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clean', default='values_named_clean_mobility_data.csv', help="cleaned csv")
+    parser.add_argument('--raw', help="raw StatLine export, used instead of --clean")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--workers', type=int, help="number of figure worker processes")
+    arguments = parser.parse_args()
+
+    serve(load_server_data(arguments.clean, arguments.raw), arguments.host, arguments.port, arguments.workers)
+
+
+if __name__ == '__main__':
+    main()
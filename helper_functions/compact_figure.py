@@ -0,0 +1,126 @@
+import numpy as np
+
+from .instrumentation import instrumented
+
+
+def _same_value(first, second):
+
+    """
+    Returns whether two plotly property values are equal, comparing arrays element by element.
+    """
+
+    if isinstance(first, (np.ndarray, list, tuple)) or isinstance(second, (np.ndarray, list, tuple)):
+        try:
+            return np.array_equal(np.asarray(first, dtype=object), np.asarray(second, dtype=object))
+        except ValueError:
+            return False
+
+    return first == second
+
+
+def _typed(value, float32):
+
+    """
+    Returns value as a numpy array when it is numeric, so plotly writes it as a base64 typed array.
+    """
+
+    if not isinstance(value, (np.ndarray, list, tuple)):
+        return value
+
+    array = np.asarray(value)
+    if array.dtype.kind not in 'fiu':
+        return value
+
+    return array.astype(np.float32) if float32 and array.dtype.kind == 'f' else array
+
+
+@instrumented
+def compact_animation(fig, float32=False):
+
+    """
+    Returns a copy of an animated plotly figure whose frames only hold the trace properties that change.
+
+    Args:
+        fig (plotly.graph_objects.Figure): Animated figure, for example from barplotanimation.
+        float32 (bool): Store the numeric arrays as 32 bit floats, which halves their size. Enough for
+            the CBS figures, which have at most 7 significant digits.
+
+    Returns:
+        plotly.graph_objects.Figure: Figure that animates the same, with smaller frames.
+
+    Notes:
+        - Every frame trace is matched to the trace with the same name, and only the properties that
+          differ between frames (for example y and the hover text with the period) are kept. Static
+          properties such as x, colors and the layout are only stored once, in fig.data and fig.layout.
+        - Every frame keeps all changing properties, so jumping to any frame with the slider restores it.
+        - Numeric arrays are numpy arrays, so plotly writes them as binary base64 typed arrays.
+        - Figures without frames are returned as they are, apart from the typed arrays.
+    """
+
+    import plotly.graph_objects as go
+
+    base_traces = [trace.to_plotly_json() for trace in fig.data]
+    position_by_name = {trace.get('name'): position for position, trace in enumerate(base_traces)}
+
+    # Match the traces of every frame to the traces of the figure
+    frames = []
+    for frame in fig.frames:
+        traces = [trace.to_plotly_json() for trace in frame.data]
+        positions = list(frame.traces) if frame.traces is not None else [
+            position_by_name.get(trace.get('name'), index) for index, trace in enumerate(traces)
+        ]
+        frames.append((frame, positions, traces))
+
+    # Properties of every trace that differ from the figure in at least one frame
+    changing = {position: set() for position in range(len(base_traces))}
+    for frame, positions, traces in frames:
+        for position, trace in zip(positions, traces):
+            base = base_traces[position]
+            changing[position].update(key for key, value in trace.items() if not _same_value(value, base.get(key)))
+
+    compact_frames = []
+    for frame, positions, traces in frames:
+        compact_traces = [
+            {'type': base_traces[position]['type'],
+             **{key: _typed(trace[key], float32) for key in sorted(changing[position]) if key in trace}}
+            for position, trace in zip(positions, traces)
+        ]
+        compact_frames.append(go.Frame(data=compact_traces, traces=positions, name=frame.name, layout=frame.layout))
+
+    data = [{key: _typed(value, float32) for key, value in trace.items()} for trace in base_traces]
+
+    return go.Figure(data=data, layout=fig.layout, frames=compact_frames)
+
+
+@instrumented
+def compact_figure_json(fig, float32=False):
+
+    """
+    Returns the plotly JSON of the compacted figure, see compact_animation.
+    """
+
+    return compact_animation(fig, float32=float32).to_json()
+
+
+@instrumented
+def write_compact_html(fig, path, plotly_js='cdn', float32=False):
+
+    """
+    Writes a compacted figure to a html file.
+
+    Args:
+        fig (plotly.graph_objects.Figure): Figure to write, animated or not.
+        path (str): Path of the html file.
+        plotly_js (str): Where the page gets plotly.js from: 'cdn', 'directory' to write one shared
+            plotly.min.js next to the html files and reference it from every page, 'inline' to put it in
+            the page (about 3.5 MB), or the url or path of a shared bundle ending in '.js'.
+        float32 (bool): Store the numeric arrays as 32 bit floats.
+
+    Returns:
+        str: path.
+    """
+
+    include_plotlyjs = True if plotly_js == 'inline' else plotly_js
+    compact_animation(fig, float32=float32).write_html(path, include_plotlyjs=include_plotlyjs, full_html=True)
+
+    return path
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+
+from .data_rename import (
+    column_names_mapping,
+    concat_clean,
+    iter_named_clean_chunks,
+    margins_mapping,
+    periods_mapping,
+    population_mapping,
+    region_char_mapping,
+    travel_modes_mapping,
+    travel_motives_mapping,
+)
+from .instrumentation import instrumented
+
+# Prefix of the cache files, the cache key is appended to it
+cache_file_prefix = "clean_mobility_"
+
+# Remember the key of every raw file, so an unchanged file is not hashed twice in one session
+_key_by_file = {}
+
+
+@instrumented
+def cache_key(raw_path):
+
+    """
+    Computes the cache key of a raw StatLine export: a hash of the file contents and the code maps.
+
+    Args:
+        raw_path (str): Path to the raw semicolon separated '84710ENG_TypedDataSet_*.csv' file.
+
+    Returns:
+        str: Hexadecimal sha256 digest that changes when the raw file or one of the maps changes.
+    """
+
+    stat = os.stat(raw_path)
+    file_id = (os.path.abspath(raw_path), stat.st_mtime_ns, stat.st_size)
+
+    if file_id in _key_by_file:
+        return _key_by_file[file_id]
+
+    digest = hashlib.sha256()
+
+    # Hash the raw file in blocks, so large files are never fully in memory
+    with open(raw_path, 'rb') as raw_file:
+        for block in iter(lambda: raw_file.read(1 << 20), b''):
+            digest.update(block)
+
+    # Hash the maps, so changing a label also invalidates the cache
+    mappings = [
+        column_names_mapping,
+        travel_motives_mapping,
+        population_mapping,
+        travel_modes_mapping,
+        margins_mapping,
+        region_char_mapping,
+        periods_mapping,
+    ]
+    digest.update(json.dumps(mappings, sort_keys=True).encode('utf-8'))
+
+    key = digest.hexdigest()
+    _key_by_file[file_id] = key
+
+    return key
+
+
+@instrumented
+def load_clean_dataset(raw_path, cache_dir="cache", chunksize=100_000, validate=False):
+
+    """
+    Loads the cleaned mobility dataset from a columnar on-disk cache, building the cache when needed.
+
+    Args:
+        raw_path (str): Path to the raw semicolon separated '84710ENG_TypedDataSet_*.csv' file.
+        cache_dir (str): Directory in which the cache files are stored.
+        chunksize (int): Number of raw rows that are read per chunk when the cache is (re)built.
+        validate (bool): Check the raw rows when the cache is (re)built and print the problems, see
+            make_named_clean_dataset. A warm start reads the cached table and checks nothing.
+
+    Returns:
+        pd.DataFrame: The same table as make_named_clean_dataset, with its categorical columns.
+
+    Notes:
+        - The cache is an uncompressed Feather (Arrow IPC) file, which is memory-mapped on a warm
+          start instead of parsing the raw csv again.
+        - The file name contains the name of the raw file and cache_key(raw_path). When the raw file
+          or the code maps change, the cache is rebuilt and the stale cache files are removed.
+        - Requires pyarrow.
+    """
+
+    import pyarrow.feather as feather
+
+    # Every raw file has its own cache files, named after the raw file and the cache key
+    file_prefix = cache_file_prefix + os.path.splitext(os.path.basename(raw_path))[0] + "_"
+    cache_path = os.path.join(cache_dir, file_prefix + cache_key(raw_path) + ".feather")
+
+    # Warm start: memory-map the cached table
+    if os.path.exists(cache_path):
+        return feather.read_table(cache_path, memory_map=True).to_pandas()
+
+    # Cold start: clean the raw file chunk by chunk and store the result
+    reports = [] if validate else None
+    clean_data = concat_clean(iter_named_clean_chunks(raw_path, chunksize=chunksize, reports=reports))
+
+    if validate:
+        from .data_validation import _print_validation_messages, merge_reports
+        _print_validation_messages(merge_reports(reports))
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Remove caches of earlier versions of the raw file or the maps
+    for file_name in os.listdir(cache_dir):
+        if file_name.startswith(file_prefix) and len(file_name) == len(os.path.basename(cache_path)):
+            os.remove(os.path.join(cache_dir, file_name))
+
+    # Write to a temporary file first, so an interrupted build never leaves a broken cache
+    temporary_path = cache_path + ".tmp"
+    feather.write_feather(clean_data, temporary_path, compression='uncompressed')
+    os.replace(temporary_path, cache_path)
+
+    print("Named And Cleaned Data Cached:", clean_data.shape, "in", cache_path, "\n")
+
+    return clean_data
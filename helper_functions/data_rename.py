@@ -1,166 +1,523 @@
 import pandas as pd
 
-def make_named_clean_dataset(dataset_unnamed):
+from .instrumentation import instrumented, span
+from .statline_metadata import compile_lookup, decode_with_lookup
+
+# Map travelmotives
+travel_motives_mapping = {
+    "2030170": "Travel to/from work, (non)-daily commute",
+    "2030190": "Services/care",
+    "2030200": "Shopping, groceries, fun shopping",
+    "2030210": "Attending education/courses",
+    "2030220": "Visits including staying overnight",
+    "2030230": "Leisure, sports",
+    "2030240": "Touring/walking",
+    "2030250": "Other",
+    "2820740": "Professionally",
+    "T001080": "Total"
+}
+
+# Map population
+population_mapping = {
+    "A048710": "Population 6 years or older",
+    "A048709": "Population: 12 years or older"
+}
+
+# Map tavelmodes
+travel_modes_mapping = {
+    "T001093": "Total",
+    "A048583": "Passenger car (driver)",
+    "A048584": "Passenger car (passenger)",
+    "A018981": "Train",
+    "A018982": "Bus/tram/metro",
+    "A018984": "Bike",
+    "A018985": "Walking",
+    "A018986": "Other"
+}
+
+# Map margins
+margins_mapping = {
+    "MW00000": "Value",
+    "MOG0095": "Lower bound 95% confidence interval",
+    "MBG0095": "Upper bound 95% confidence interval"
+}
+
+# Map regions
+region_char_mapping = {
+    "NL01    ": "The Netherlands",
+    "LD01    ": "Noord-Nederland (LD)",
+    "LD02    ": "Oost-Nederland (LD)",
+    "LD03    ": "West-Nederland (LD)",
+    "LD04    ": "Zuid-Nederland (LD)",
+    "PV20    ": "Groningen (PV)",
+    "PV21    ": "Fryslân (PV)",
+    "PV22    ": "Drenthe (PV)",
+    "PV23    ": "Overijssel (PV)",
+    "PV24    ": "Flevoland (PV)",
+    "PV25    ": "Gelderland (PV)",
+    "PV26    ": "Utrecht (PV)",
+    "PV27    ": "Noord-Holland (PV)",
+    "PV28    ": "Zuid-Holland (PV)",
+    "PV29    ": "Zeeland (PV)",
+    "PV30    ": "Noord-Brabant (PV)",
+    "PV31    ": "Limburg (PV)",
+    "1018850 ": "Extremely urbanised",
+    "1018905 ": "Strongly urbanised",
+    "1018955 ": "Moderately urbanised",
+    "1019005 ": "Hardly urbanised",
+    "1019052 ": "Not urbanised"
+}
+
+# Map periods
+periods_mapping = {
+    "2018JJ00": "2018",
+    "2019JJ00": "2019",
+    "2020JJ00": "2020",
+    "2021JJ00": "2021",
+    "2022JJ00": "2022",
+    "2023JJ00": "2023"
+}
+
+# Map the column names
+column_names_mapping = {
+    "TravelMotives": "TravelMotivesCode",
+    "Population": "PopulationCode",
+    "TravelModes": "TravelModesCode",
+    "Margins": "MarginsCode",
+    "RegionCharacteristics": "RegionCharacteristicsCode",
+    "Periods": "PeriodsCode",
+    "Trips_1": "Trips_Per_Day",
+    "DistanceTravelled_2": "Distance_Travelled_PassengerKm_Per_Day",
+    "TimeTravelled_3": "Time_Travelled_Minutes_Per_Day",
+    "Trips_4": "Trips_Per_Year",
+    "DistanceTravelled_5": "Distance_Travelled_PassengerKm_Per_Year",
+    "TimeTravelled_6": "Time_Travelled_Hours_Per_Year"
+}
+
+# List of original code columns to drop
+code_columns = [
+    'TravelMotivesCode',
+    'PopulationCode',
+    'TravelModesCode',
+    'MarginsCode',
+    'RegionCharacteristicsCode',
+    'PeriodsCode'
+]
+
+# List of numerical columns
+numeric_columns = [
+    'Trips_Per_Day',
+    'Distance_Travelled_PassengerKm_Per_Day',
+    'Time_Travelled_Minutes_Per_Day',
+    'Trips_Per_Year',
+    'Distance_Travelled_PassengerKm_Per_Year',
+    'Time_Travelled_Hours_Per_Year'
+]
+
+# Suffixes of the confidence interval columns, made when the margins are kept
+lower_bound_suffix = '_Lower'
+upper_bound_suffix = '_Upper'
+bound_columns = [col + suffix for col in numeric_columns for suffix in [lower_bound_suffix, upper_bound_suffix]]
+
+# Dimensions that identify a figure, apart from its margin
+dimension_columns = ['TravelMotives', 'Population', 'TravelModes', 'RegionCharacteristics', 'Period']
+
+# Codes of the rows that are kept by the cleaning step
+value_margin_code = "MW00000"
+population_6_plus_code = "A048710"
+urbanised_region_codes = [code for code, name in region_char_mapping.items() if 'urbanised' in name.lower()]
+
+# Define the correct order for 'RegionCharacteristics'
+urbanisation_order = ['Not urbanised', 'Hardly urbanised', 'Moderately urbanised', 'Strongly urbanised', 'Extremely urbanised']
+
+
+# Compiled lookup per code map, keyed by its items, so a map is compiled once per session
+_lookups = {}
+
+
+def _decode_codes(codes, mapping):
+
+    """
+    Decodes a column of codes into an ordered Categorical with the labels of mapping, unknown codes become NaN.
+    The map is compiled into lookup arrays once, so every row is decoded with one vectorised take.
+    """
+
+    return decode_with_lookup(codes, _lookup(mapping))
+
+
+def _lookup(mapping):
+
+    """
+    Returns the compiled lookup of a code map, compiling it the first time the map is seen.
+    """
+
+    key = tuple(mapping.items())
+    if key not in _lookups:
+        _lookups[key] = compile_lookup(mapping)
+
+    return _lookups[key]
+
+
+def decode_period_code(code):
+
+    """
+    Decodes one StatLine period code: '2020JJ00' becomes '2020', '2020KW02' '2020 Q2' and '2020MM07' '2020-07'.
+    Codes in periods_mapping use its label, unknown codes give None.
+    """
+
+    if code in periods_mapping:
+        return periods_mapping[code]
+
+    code = str(code).strip()
+    year, kind, number = code[:4], code[4:6], code[6:8]
+
+    if len(code) != 8 or not year.isdigit() or not number.isdigit():
+        return None
+    if kind == 'JJ':
+        return year
+    if kind == 'KW':
+        return f"{year} Q{int(number)}"
+    if kind == 'MM':
+        return f"{year}-{number}"
+
+    return None
+
+
+# Order of the period kinds within a year: the year itself, then its quarters, then its months
+period_kind_order = {'JJ': 0, 'KW': 1, 'MM': 2}
+
+
+def _period_sort_key(code):
+
+    """
+    Sorts a StatLine period code by (year, kind, number), so the year, quarter and month labels of a year
+    follow each other in that order. Codes that are not of that form come last, in text order.
+    """
+
+    code = str(code).strip()
+    year, kind, number = code[:4], code[4:6], code[6:8]
+
+    if len(code) != 8 or not year.isdigit() or not number.isdigit() or kind not in period_kind_order:
+        return (1, 0, 0, 0, code)
+
+    return (0, int(year), period_kind_order[kind], int(number), code)
+
+
+@instrumented
+def decode_periods(codes):
+
+    """
+    Decodes a column of StatLine period codes into an ordered Categorical, ordered by time.
+
+    Args:
+        codes (pd.Series): Period codes such as '2023JJ00', '2023KW01' or '2023MM01'.
+
+    Returns:
+        pd.Categorical: The period labels, unknown codes become NaN.
+
+    Notes:
+        - Only the distinct codes are decoded, every row gets its label through the category codes.
+        - The categories are ordered by year, then year before quarters before months, then number.
+    """
+
+    # Decode every distinct code once, in the order of time
+    period_codes = sorted(pd.unique(codes.dropna()), key=_period_sort_key)
+    labels = [decode_period_code(code) for code in period_codes]
+    known = [(code, label) for code, label in zip(period_codes, labels) if label is not None]
+
+    return _decode_codes(codes, dict(known))
+
+
+@instrumented
+def concat_clean(frames):
+
+    """
+    Concatenates cleaned tables and keeps the categorical columns, also when their periods differ.
+
+    Args:
+        frames (iterable of pd.DataFrame): Cleaned tables, for example the chunks of iter_named_clean_chunks.
+
+    Returns:
+        pd.DataFrame: One table with a fresh index, the 'Period' categories are the sorted union of all periods.
+    """
+
+    frames = list(frames)
+    if not frames:
+        return pd.DataFrame()
+
+    # Give every table the same period categories, otherwise pandas falls back to plain strings
+    if all(isinstance(frame['Period'].dtype, pd.CategoricalDtype) for frame in frames):
+        periods = sorted(set().union(*[frame['Period'].cat.categories for frame in frames]))
+        frames = [frame.assign(Period=frame['Period'].cat.set_categories(periods, ordered=True)) for frame in frames]
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def _pivot_margins(data):
+
+    """
+    Turns the value, lower bound and upper bound rows of every figure into one row with bound columns.
+    Every row is visited once: figures are numbered by hashing their dimension codes and the bounds are
+    scattered into arrays by that number, so the table stays one row per figure.
+    """
+
+    import numpy as np
+
+    # Number every figure by the combination of its dimension codes
+    codes = [data[col].cat.codes.to_numpy().astype(np.int64) + 1 for col in dimension_columns]
+    shape = [len(data[col].cat.categories) + 1 for col in dimension_columns]
+    figure_number, figures = pd.factorize(np.ravel_multi_index(codes, shape))
+
+    # Position of the margin in margins_mapping: 0 is the value, 1 the lower bound and 2 the upper bound
+    margin = data['Margins'].cat.codes.to_numpy()
+    is_value = margin == 0
+
+    wide = data[is_value]
+    wide_number = figure_number[is_value]
+
+    # Scatter the bounds into one array per column and pick the entries of the value rows
+    bounds = {}
+    for col in numeric_columns:
+        values = data[col].to_numpy(dtype=float)
+        for margin_position, suffix in [(1, lower_bound_suffix), (2, upper_bound_suffix)]:
+            is_bound = margin == margin_position
+            bound = np.full(len(figures), np.nan)
+            bound[figure_number[is_bound]] = values[is_bound]
+            bounds[col + suffix] = bound[wide_number]
+
+    return wide.assign(**bounds)
+
+
+def _name_and_clean(data, confidence_intervals=False, validate=False):
+
+    """
+    Renames, maps and filters a raw dataset without printing anything, shared by the in-memory and chunked cleaners.
+    Returns the cleaned table and, with validate, the ValidationReport of the raw rows, otherwise None.
+    """
+
+    # Map the column names
+    data.rename(columns=column_names_mapping, inplace=True)
+
+    # Map the columns with the difined maps, stored as categoricals so every label is kept only once
+    with span('data_rename.decode_codes', rows_in=len(data)):
+        data['TravelMotives'] = _decode_codes(data['TravelMotivesCode'], travel_motives_mapping)
+
+        data['Population'] = _decode_codes(data['PopulationCode'], population_mapping)
+
+        data['TravelModes'] = _decode_codes(data['TravelModesCode'], travel_modes_mapping)
+
+        data['Margins'] = _decode_codes(data['MarginsCode'], margins_mapping)
+
+        data['RegionCharacteristics'] = _decode_codes(data['RegionCharacteristicsCode'], region_char_mapping)
+
+        data['Period'] = decode_periods(data['PeriodsCode'])
+
+    # Keep the numeric columns as read, to find the values that fail to convert
+    raw_numeric = {col: data[col] for col in numeric_columns} if validate else None
+
+    # Convert columns to numeric, coercing errors to NaN
+    with span('data_rename.to_numeric', rows_in=len(data)):
+        for col in numeric_columns:
+            data[col] = pd.to_numeric(data[col], errors='coerce')
+
+    # Check the decoded and converted rows before anything is dropped
+    report = None
+    if validate:
+        from .data_validation import _validation_report
+        report = _validation_report(data, raw_numeric)
+
+    # Drop the code columns
+    data.drop(columns=code_columns, inplace=True)
+
+    with span('data_rename.filter', rows_in=len(data)) as filter_span:
+        # Only show population of 6 years and older, and without confidence intervals only the values
+        keep = data['RegionCharacteristics'].isin(urbanisation_order) & (data['Population'] == 'Population 6 years or older')
+        if not confidence_intervals:
+            keep &= data['Margins'] == 'Value'
+
+        # Select the rows once with the combined mask
+        data = data[keep.to_numpy()]
+
+        if confidence_intervals:
+            # Keep the bounds next to the values, missing bounds are allowed
+            data = _pivot_margins(data)
+            clean_data = data.dropna(subset=dimension_columns + numeric_columns)
+        else:
+            clean_data = data.dropna()
+
+        filter_span.set_rows_out(len(clean_data))
+
+    # Only the urbanisation levels are left, so order them from not to extremely urbanised
+    clean_data = clean_data.assign(
+        RegionCharacteristics=clean_data['RegionCharacteristics'].cat.set_categories(urbanisation_order, ordered=True)
+    )
+
+    return clean_data, report
+
+
+@instrumented
+def make_named_clean_dataset(dataset_unnamed, confidence_intervals=False, validate=False, return_report=False):
 
     """
     Cleans and renames columns in a dataset, mapping codes to descriptive names for readability.
 
     Args:
-        dataset_unnamed (pd.DataFrame): DataFrame with unnamed columns that need to be mapped to 
+        dataset_unnamed (pd.DataFrame): DataFrame with unnamed columns that need to be mapped to
             descriptive labels.
+        confidence_intervals (bool): Also keep the 95% confidence interval of every figure, as
+            '<column>_Lower' and '<column>_Upper' columns next to every numeric column.
+        validate (bool): Check the raw rows for unknown codes, values that are not a number, per day
+            values that do not match the per year values and mode totals that differ from the sum of
+            the modes, and print the problems that are found.
+        return_report (bool): Also return the ValidationReport, its checks run without printing them
+            when validate is False.
 
     Returns:
-        pd.DataFrame: A cleaned DataFrame with renamed columns, mapped values for easier interpretation, 
-            and filtered data for specific conditions.
-    
+        pd.DataFrame: A cleaned DataFrame with renamed columns, mapped values for easier interpretation,
+            and filtered data for specific conditions. With return_report a tuple of the DataFrame and
+            its ValidationReport.
+
     Notes:
-        - Columns for travel motives, population groups, travel modes, margins, region characteristics, 
+        - Columns for travel motives, population groups, travel modes, margins, region characteristics,
           and periods are mapped to readable names.
-        - Filters the dataset to include only "Population 6 years or older" and data with "Value" in 
+        - Filters the dataset to include only "Population 6 years or older" and data with "Value" in
           the margins column.
         - Retains data with "urbanised" in the 'RegionCharacteristics' column.
         - Drops rows with missing values and returns the cleaned DataFrame.
+        - The label columns are ordered categoricals in the order of the code maps, with
+          'RegionCharacteristics' ordered from 'Not urbanised' to 'Extremely urbanised'.
+        - With confidence_intervals the lower and upper bound rows are pivoted onto the row of their
+          value, so the table keeps one row per figure.
+        - The checks of validate run on the decoded columns of the cleaning step itself, see
+          validate_dataset for the details of the report.
     """
-    
-    data = dataset_unnamed
-
-    # Map travelmotives
-    travel_motives_mapping = {
-        "2030170": "Travel to/from work, (non)-daily commute",
-        "2030190": "Services/care",
-        "2030200": "Shopping, groceries, fun shopping",
-        "2030210": "Attending education/courses",
-        "2030220": "Visits including staying overnight",
-        "2030230": "Leisure, sports",
-        "2030240": "Touring/walking",
-        "2030250": "Other",
-        "2820740": "Professionally",
-        "T001080": "Total"
-    }
 
-    # Map population
-    population_mapping = {
-        "A048710": "Population 6 years or older",
-        "A048709": "Population: 12 years or older"
-    }
+    clean_data, report = _name_and_clean(
+        dataset_unnamed, confidence_intervals=confidence_intervals, validate=validate or return_report
+    )
 
-    # Map tavelmodes
-    travel_modes_mapping = {
-        "T001093": "Total",
-        "A048583": "Passenger car (driver)",
-        "A048584": "Passenger car (passenger)",
-        "A018981": "Train",
-        "A018982": "Bus/tram/metro",
-        "A018984": "Bike",
-        "A018985": "Walking",
-        "A018986": "Other"
-    }
+    if validate:
+        from .data_validation import _print_validation_messages
+        _print_validation_messages(report)
 
-    # Map margins
-    margins_mapping = {
-        "MW00000": "Value",
-        "MOG0095": "Lower bound 95% confidence interval",
-        "MBG0095": "Upper bound 95% confidence interval"
-    }
+    print("Named And Cleaned Data After Dropping Missing Values:", clean_data.shape, "\n")
 
-    # Map regions
-    region_char_mapping = {
-        "NL01    ": "The Netherlands",
-        "LD01    ": "Noord-Nederland (LD)",
-        "LD02    ": "Oost-Nederland (LD)",
-        "LD03    ": "West-Nederland (LD)",
-        "LD04    ": "Zuid-Nederland (LD)",
-        "PV20    ": "Groningen (PV)",
-        "PV21    ": "Fryslân (PV)",
-        "PV22    ": "Drenthe (PV)",
-        "PV23    ": "Overijssel (PV)",
-        "PV24    ": "Flevoland (PV)",
-        "PV25    ": "Gelderland (PV)",
-        "PV26    ": "Utrecht (PV)",
-        "PV27    ": "Noord-Holland (PV)",
-        "PV28    ": "Zuid-Holland (PV)",
-        "PV29    ": "Zeeland (PV)",
-        "PV30    ": "Noord-Brabant (PV)",
-        "PV31    ": "Limburg (PV)",
-        "1018850 ": "Extremely urbanised",
-        "1018905 ": "Strongly urbanised",
-        "1018955 ": "Moderately urbanised",
-        "1019005 ": "Hardly urbanised",
-        "1019052 ": "Not urbanised"
-    }
+    if return_report:
+        return clean_data, report
+
+    return clean_data
+
+
+def iter_named_clean_chunks(file_path, chunksize=100_000, period_codes=None, reports=None):
+
+    """
+    Streams a raw CBS StatLine export in chunks and yields the cleaned version of every chunk.
+
+    Args:
+        file_path (str): Path to the raw semicolon separated '84710ENG_TypedDataSet_*.csv' file.
+        chunksize (int): Number of raw rows that are read per chunk.
+        period_codes (list of str, optional): Only clean the rows of these period codes, for example
+            ['2024JJ00'] to process a newly published year.
+        reports (list, optional): When given, the ValidationReport of the raw rows of every chunk is
+            appended to it, before any row is dropped. Merge them with merge_reports.
+
+    Yields:
+        pd.DataFrame: The cleaned rows of one chunk, in the same format as make_named_clean_dataset.
 
-    # Map periods
-    periods_mapping = {
-        "2018JJ00": "2018",
-        "2019JJ00": "2019",
-        "2020JJ00": "2020",
-        "2021JJ00": "2021",
-        "2022JJ00": "2022",
-        "2023JJ00": "2023"
+    Notes:
+        - Rows of other populations, confidence interval margins and non urbanisation regions are
+          dropped on their codes before any mapping happens, so only the kept rows are mapped. The
+          checks of reports only look up the categories of the code columns and run on their codes.
+        - Code columns are read as categoricals of strings so the padded region codes match the mapping
+          keys, and decoding only looks up the categories.
+        - Chunks without any kept rows are skipped, their report is still appended to reports.
+        - Without reports nothing is validated, so unknown codes are dropped silently.
+    """
+
+    # Read the code columns as categoricals of text, so they match the keys of the maps and every distinct
+    # code is only looked up once
+    code_dtypes = {
+        column: 'category' for column, code_column in column_names_mapping.items() if code_column in code_columns
     }
 
-    # Map the column names
-    data.rename(columns={
-        "TravelMotives": "TravelMotivesCode",
-        "Population": "PopulationCode",
-        "TravelModes": "TravelModesCode",
-        "Margins": "MarginsCode",
-        "RegionCharacteristics": "RegionCharacteristicsCode",
-        "Periods": "PeriodsCode",
-        "Trips_1": "Trips_Per_Day",
-        "DistanceTravelled_2": "Distance_Travelled_PassengerKm_Per_Day",
-        "TimeTravelled_3": "Time_Travelled_Minutes_Per_Day",
-        "Trips_4": "Trips_Per_Year",
-        "DistanceTravelled_5": "Distance_Travelled_PassengerKm_Per_Year",
-        "TimeTravelled_6": "Time_Travelled_Hours_Per_Year"
-    }, inplace=True)
-
-    # Map the columns with the difined maps
-    data['TravelMotives'] = data['TravelMotivesCode'].map(travel_motives_mapping)
-
-    data['Population'] = data['PopulationCode'].map(population_mapping)
-
-    data['TravelModes'] = data['TravelModesCode'].map(travel_modes_mapping)
-
-    data['Margins'] = data['MarginsCode'].map(margins_mapping)
-
-    data['RegionCharacteristics'] = data['RegionCharacteristicsCode'].map(region_char_mapping)
-
-    data['Period'] = data['PeriodsCode'].map(periods_mapping)
-
-    # List of original code columns to drop
-    code_columns = [
-        'TravelMotivesCode',
-        'PopulationCode',
-        'TravelModesCode',
-        'MarginsCode',
-        'RegionCharacteristicsCode',
-        'PeriodsCode'
-    ]
+    # Parse StatLine's '.' for a figure that is not available as missing, so the figures are read as numbers
+    reader = pd.read_csv(
+        file_path, delimiter=';', encoding='utf-8', dtype=code_dtypes, na_values=['.'], chunksize=chunksize
+    )
 
-    # Drop the code columns
-    data.drop(columns=code_columns, inplace=True)
+    while True:
 
-    # List of numerical columns
-    numeric_columns = [
-        'Trips_Per_Day',
-        'Distance_Travelled_PassengerKm_Per_Day',
-        'Time_Travelled_Minutes_Per_Day',
-        'Trips_Per_Year',
-        'Distance_Travelled_PassengerKm_Per_Year',
-        'Time_Travelled_Hours_Per_Year'
-    ]
+        # Parse the next chunk, the parsing is its own span so it can be told apart from the cleaning
+        with span('data_rename.read_csv_chunk') as read_span:
+            chunk = next(reader, None)
+            read_span.set_rows_out(None if chunk is None else len(chunk))
 
-    # Convert columns to numeric, coercing errors to NaN
-    for col in numeric_columns:
-        data[col] = pd.to_numeric(data[col], errors='coerce')
+        if chunk is None:
+            break
 
-    data = data[data['RegionCharacteristics'].str.contains('urbanised', case=False, na=False)]
+        if period_codes is not None:
+            chunk = chunk[chunk['Periods'].isin(period_codes)]
 
-    # Only keep the values and only show population of 6 years and older
-    data = data[(data['Margins'] == 'Value') & (data['Population'] == 'Population 6 years or older') ]
+        # Check the raw rows on their category codes, the code filter below would drop unknown codes without a trace
+        if reports is not None:
+            from .data_validation import _chunk_report
+            reports.append(_chunk_report(chunk))
 
-    clean_data = data.dropna()
-    print("Named And Cleaned Data After Dropping Missing Values:", clean_data.shape, "\n")
+        # Filter on the codes first, so the mapping only touches the rows that are kept
+        chunk = chunk[
+            (chunk['Population'] == population_6_plus_code) &
+            (chunk['Margins'] == value_margin_code) &
+            (chunk['RegionCharacteristics'].isin(urbanised_region_codes))
+        ]
+
+        if chunk.empty:
+            continue
+
+        clean_chunk, _ = _name_and_clean(chunk.copy())
+
+        if not clean_chunk.empty:
+            yield clean_chunk
+
+
+@instrumented
+def write_named_clean_dataset(file_path, output_path, chunksize=100_000, validate=False):
+
+    """
+    Cleans a raw CBS StatLine export chunk by chunk and writes the result to a csv file.
+
+    Args:
+        file_path (str): Path to the raw semicolon separated '84710ENG_TypedDataSet_*.csv' file.
+        output_path (str): Path of the csv file the cleaned rows are written to.
+        chunksize (int): Number of raw rows that are read per chunk.
+        validate (bool): Check every raw chunk and print the problems of the merged report, see
+            make_named_clean_dataset.
+
+    Returns:
+        int: Number of cleaned rows written to output_path.
+
+    Notes:
+        - Peak memory stays around the size of one chunk, independent of the size of the raw file.
+        - The written file has the same columns as the output of make_named_clean_dataset, also when no
+          row is kept and only the header is written.
+    """
+
+    rows_written = 0
+    reports = [] if validate else None
+
+    # Write the header with the first chunk and append every next chunk
+    for clean_chunk in iter_named_clean_chunks(file_path, chunksize=chunksize, reports=reports):
+        clean_chunk.to_csv(output_path, mode='w' if rows_written == 0 else 'a', header=rows_written == 0, index=False)
+        rows_written += len(clean_chunk)
+
+    # Without kept rows only the header is written, from the cleaning of an empty raw table
+    if rows_written == 0:
+        empty_chunk, _ = _name_and_clean(pd.read_csv(file_path, delimiter=';', encoding='utf-8', nrows=0))
+        empty_chunk.to_csv(output_path, index=False)
+
+    if validate:
+        from .data_validation import _print_validation_messages, merge_reports
+        _print_validation_messages(merge_reports(reports))
+
+    print("Named And Cleaned Data Written:", rows_written, "rows to", output_path, "\n")
 
-    return clean_data
\ No newline at end of file
+    return rows_written
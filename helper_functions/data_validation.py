@@ -0,0 +1,428 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .instrumentation import instrumented, span
+
+# rows is the number of raw rows checked, unmapped_codes per dimension the unknown codes and their row
+# counts, coercion_failures per numeric column the text values that are not a number and their row counts,
+# missing_values per numeric column the number of missing values after coercion, day_year_mismatches per
+# year column the number of rows that do not match the per day column, and mode_total_mismatches per
+# column the number of figures whose 'Total' mode differs from the sum of the other modes
+ValidationReport = namedtuple(
+    'ValidationReport',
+    ['rows', 'unmapped_codes', 'coercion_failures', 'missing_values', 'day_year_mismatches', 'mode_total_mismatches'],
+)
+
+# Label columns and the code columns they are decoded from
+decoded_columns = {
+    'TravelMotives': 'TravelMotivesCode',
+    'Population': 'PopulationCode',
+    'TravelModes': 'TravelModesCode',
+    'Margins': 'MarginsCode',
+    'RegionCharacteristics': 'RegionCharacteristicsCode',
+    'Period': 'PeriodsCode',
+}
+
+# Per day column, per year column and the factor from a day to a year
+day_year_columns = [
+    ('Trips_Per_Day', 'Trips_Per_Year', 365),
+    ('Distance_Travelled_PassengerKm_Per_Day', 'Distance_Travelled_PassengerKm_Per_Year', 365),
+    ('Time_Travelled_Minutes_Per_Day', 'Time_Travelled_Hours_Per_Year', 365 / 60),
+]
+
+# Columns of which the 'Total' mode should equal the sum of the other modes
+mode_total_columns = ['Trips_Per_Year', 'Distance_Travelled_PassengerKm_Per_Year', 'Time_Travelled_Hours_Per_Year']
+
+# Texts StatLine uses for a value that is not available, these are missing values and not failures
+missing_markers = ['.', '']
+
+# Per code column and tuple of categories, which categories are known codes, raw chunks mostly share them
+_known_categories = {}
+
+
+def _unmapped_codes(data):
+
+    """
+    Counts the codes that did not decode, per dimension, from the category codes of the decoded columns.
+    """
+
+    unmapped = {}
+
+    for label_column, code_column in decoded_columns.items():
+        if label_column not in data.columns or code_column not in data.columns:
+            continue
+        # Only the rows without a label are visited, and only when there are any
+        undecoded = np.flatnonzero(data[label_column].cat.codes.to_numpy() < 0)
+        if len(undecoded):
+            counts = data[code_column].iloc[undecoded].dropna().value_counts()
+            # Categorical codes also count the categories that are not in these rows
+            counts = counts[counts > 0]
+            if len(counts):
+                unmapped[code_column] = counts.to_dict()
+
+    return unmapped
+
+
+def _coercion_failures(raw_numeric, numeric):
+
+    """
+    Counts the text values that to_numeric turned into NaN, per column, apart from the missing markers.
+    """
+
+    failures = {}
+
+    for col, raw in raw_numeric.items():
+        # Columns that were already parsed as numbers can not have failed
+        if pd.api.types.is_numeric_dtype(raw.dtype):
+            continue
+        failed = np.flatnonzero(numeric[col].isna().to_numpy())
+        if len(failed):
+            values = raw.iloc[failed].dropna().astype(str).str.strip()
+            values = values[~values.isin(missing_markers)]
+            if len(values):
+                failures[col] = values.value_counts().to_dict()
+
+    return failures
+
+
+def _day_year_mismatches(data, rtol, day_decimals):
+
+    """
+    Counts the rows where the per day value times the days of a year differs from the per year value.
+    The per day values are rounded to day_decimals, so the rounding error times the factor is allowed,
+    plus half a unit for the rounding of the per year value.
+    """
+
+    mismatches = {}
+
+    for day_column, year_column, factor in day_year_columns:
+        if day_column not in data or year_column not in data:
+            continue
+        day = data[day_column].to_numpy(dtype=float)
+        year = data[year_column].to_numpy(dtype=float)
+        tolerance = rtol * np.abs(year) + factor * 0.5 * 10.0 ** -day_decimals + 0.5
+        with np.errstate(invalid='ignore'):
+            mismatches[year_column] = int(np.count_nonzero(np.abs(day * factor - year) > tolerance))
+
+    return mismatches
+
+
+def _mode_total_counts(codes, shape, mode_codes, total_code, n_parts, keep, numeric, rtol):
+
+    """
+    Counts the figures whose total mode differs from the sum of the other modes, with one bincount per column.
+    codes holds the integer codes of the figure dimensions and shape their number of categories, keep marks
+    the rows that are checked and numeric holds the measure columns.
+    """
+
+    keep = np.flatnonzero(keep)
+
+    # Flat index of the codes of the kept rows, in int64 so it does not overflow
+    figure_number = np.zeros(len(keep), dtype=np.int64)
+    for code, size in zip(codes, shape):
+        figure_number = figure_number * size + code[keep]
+    n_figures = int(np.prod(shape))
+
+    # Use the flat index as figure number when it is small, otherwise number the figures that occur
+    if n_figures > 4 * len(figure_number) + 1024:
+        figure_number, figures = pd.factorize(figure_number)
+        n_figures = len(figures)
+    is_total = mode_codes[keep] == total_code
+    total_rows = np.flatnonzero(is_total)
+    total_figures = figure_number[total_rows]
+
+    mismatches = {}
+    for col in mode_total_columns:
+        if col not in numeric:
+            continue
+        values = numeric[col].to_numpy(dtype=float)[keep]
+
+        # Sum and number of the other modes, and the total, of every figure, a missing total stays NaN
+        parts = ~is_total & ~np.isnan(values)
+        part_sums = np.bincount(figure_number, weights=np.where(parts, values, 0.0), minlength=n_figures)
+        part_counts = np.bincount(figure_number, weights=parts, minlength=n_figures)
+        totals = np.full(n_figures, np.nan)
+        totals[total_figures] = values[total_rows]
+
+        # Every mode is rounded, so half a unit per mode is allowed next to the relative tolerance
+        complete = (part_counts == n_parts) & ~np.isnan(totals)
+        tolerance = rtol * np.abs(totals[complete]) + 0.5 * (n_parts + 1)
+        mismatches[col] = int(np.count_nonzero(np.abs(part_sums[complete] - totals[complete]) > tolerance))
+
+    return mismatches
+
+
+def _mode_total_mismatches(data, rtol, total_mode):
+
+    """
+    Counts the mode total mismatches of a decoded table, see _mode_total_counts.
+    Only value rows are checked, and only figures where the total and every other mode have a value.
+    """
+
+    figure_columns = ['TravelMotives', 'Population', 'RegionCharacteristics', 'Period']
+    modes = data['TravelModes'].cat
+
+    if total_mode not in modes.categories:
+        return {}
+
+    # Rows with a missing label are left out
+    codes = [data[col].cat.codes.to_numpy() for col in figure_columns]
+    mode_codes = modes.codes.to_numpy()
+    keep = (mode_codes >= 0) & np.logical_and.reduce([code >= 0 for code in codes])
+    if 'Margins' in data.columns:
+        keep &= (data['Margins'] == 'Value').to_numpy()
+
+    return _mode_total_counts(
+        codes, [len(data[col].cat.categories) for col in figure_columns], mode_codes,
+        modes.categories.get_loc(total_mode), len(modes.categories) - 1, keep, data, rtol,
+    )
+
+
+def _validation_report(data, raw_numeric, rtol=0.01, day_decimals=2, total_mode='Total'):
+
+    """
+    Builds the ValidationReport of a decoded raw table that still has its code columns, see validate_dataset.
+    raw_numeric holds the numeric columns as they were before to_numeric.
+    """
+
+    with span('data_validation.checks', rows_in=len(data)):
+        return ValidationReport(
+            rows=len(data),
+            unmapped_codes=_unmapped_codes(data),
+            coercion_failures=_coercion_failures(raw_numeric, data),
+            missing_values={col: int(data[col].isna().sum()) for col in raw_numeric},
+            day_year_mismatches=_day_year_mismatches(data, rtol, day_decimals),
+            mode_total_mismatches=_mode_total_mismatches(data, rtol, total_mode),
+        )
+
+
+def _chunk_report(chunk, rtol=0.01, day_decimals=2, total_mode='Total'):
+
+    """
+    Builds the ValidationReport of a raw chunk of iter_named_clean_chunks, whose code columns are categoricals.
+    No row is decoded: only the categories are looked up and the checks run on the category codes.
+    """
+
+    from .data_rename import (
+        _lookup,
+        column_names_mapping,
+        decode_period_code,
+        margins_mapping,
+        numeric_columns,
+        population_mapping,
+        region_char_mapping,
+        travel_modes_mapping,
+        travel_motives_mapping,
+        value_margin_code,
+    )
+
+    raw_names = {name: raw for raw, name in column_names_mapping.items()}
+    mappings = {
+        'TravelMotivesCode': travel_motives_mapping,
+        'PopulationCode': population_mapping,
+        'TravelModesCode': travel_modes_mapping,
+        'MarginsCode': margins_mapping,
+        'RegionCharacteristicsCode': region_char_mapping,
+        'PeriodsCode': None,
+    }
+
+    with span('data_validation.checks', rows_in=len(chunk)):
+        codes = {}
+        categories = {}
+        unmapped = {}
+        known_rows = np.ones(len(chunk), dtype=bool)
+
+        # Look up the categories of every code column, the rows only through their category codes
+        for code_column, mapping in mappings.items():
+            column = chunk[raw_names[code_column]]
+            if not isinstance(column.dtype, pd.CategoricalDtype):
+                column = column.astype('category')
+            categories[code_column] = column.cat.categories
+            codes[code_column] = column.array.codes
+
+            key = (code_column, tuple(categories[code_column]))
+            if key not in _known_categories:
+                if mapping is None:
+                    known = [decode_period_code(code) is not None for code in categories[code_column]]
+                    _known_categories[key] = np.array(known, dtype=bool)
+                else:
+                    _known_categories[key] = _lookup(mapping).codes.get_indexer(categories[code_column]) >= 0
+            known = _known_categories[key]
+
+            # The rows are only counted when a code is unknown or missing, which is rare
+            present = codes[code_column] >= 0
+            if known.all() and present.all():
+                continue
+
+            counts = np.bincount(codes[code_column][present], minlength=len(known))
+            unknown = np.flatnonzero(~known & (counts > 0))
+            if len(unknown):
+                unmapped[code_column] = {categories[code_column][position]: int(counts[position]) for position in unknown}
+            known_rows &= np.append(known, False)[codes[code_column]]
+
+        # Numbers are parsed by read_csv, only text columns are converted
+        raw_numeric = {col: chunk[raw_names[col]] for col in numeric_columns if raw_names[col] in chunk.columns}
+        numeric = {
+            col: raw if pd.api.types.is_numeric_dtype(raw.dtype) else pd.to_numeric(raw, errors='coerce')
+            for col, raw in raw_numeric.items()
+        }
+
+        # Only value rows with known codes take part in the mode total check
+        mode_total = {}
+        mode_categories = categories['TravelModesCode']
+        total_codes = [code for code, label in travel_modes_mapping.items() if label == total_mode]
+        margin_position = categories['MarginsCode'].get_indexer([value_margin_code])[0]
+        if total_codes and total_codes[0] in mode_categories and margin_position >= 0:
+            figure_columns = ['TravelMotivesCode', 'PopulationCode', 'RegionCharacteristicsCode', 'PeriodsCode']
+            mode_total = _mode_total_counts(
+                [codes[col] for col in figure_columns], [len(categories[col]) for col in figure_columns],
+                codes['TravelModesCode'], mode_categories.get_loc(total_codes[0]), len(travel_modes_mapping) - 1,
+                known_rows & (codes['MarginsCode'] == margin_position), numeric, rtol,
+            )
+
+        return ValidationReport(
+            rows=len(chunk),
+            unmapped_codes=unmapped,
+            coercion_failures=_coercion_failures(raw_numeric, numeric),
+            missing_values={col: int(np.isnan(values.to_numpy(dtype=float)).sum()) for col, values in numeric.items()},
+            day_year_mismatches=_day_year_mismatches(numeric, rtol, day_decimals),
+            mode_total_mismatches=mode_total,
+        )
+
+
+def validation_messages(report):
+
+    """
+    Describes the problems in a ValidationReport.
+
+    Args:
+        report (ValidationReport): Report of validate_dataset or make_named_clean_dataset.
+
+    Returns:
+        list of str: One message per problem, empty when every check passed. Missing values are not
+            a problem on their own, StatLine marks figures that are not published with '.'.
+    """
+
+    messages = []
+
+    for code_column, counts in report.unmapped_codes.items():
+        messages.append(f"{code_column}: {sum(counts.values())} rows with unknown codes {sorted(counts)}")
+
+    for col, counts in report.coercion_failures.items():
+        messages.append(f"{col}: {sum(counts.values())} values that are not a number {sorted(counts)[:10]}")
+
+    for col, count in report.day_year_mismatches.items():
+        if count:
+            messages.append(f"{col}: {count} rows that do not match the per day value")
+
+    for col, count in report.mode_total_mismatches.items():
+        if count:
+            messages.append(f"{col}: {count} figures where the total mode differs from the sum of the modes")
+
+    return messages
+
+
+def merge_reports(reports):
+
+    """
+    Merges the ValidationReports of the chunks or shards of one export into one report.
+
+    Args:
+        reports (iterable of ValidationReport): Reports of parts of an export, for example the chunks of
+            iter_named_clean_chunks.
+
+    Returns:
+        ValidationReport: The summed rows and counts of all reports.
+
+    Notes:
+        - The mode total check only counts figures of which the total and every mode are in the same
+          part, a figure that is split over two chunks is not checked.
+    """
+
+    def add_counts(counts_per_key):
+        merged = {}
+        for counts in counts_per_key:
+            for key, count in counts.items():
+                if isinstance(count, dict):
+                    merged[key] = add_counts([merged.get(key, {}), count])
+                else:
+                    merged[key] = merged.get(key, 0) + count
+        return merged
+
+    reports = list(reports)
+
+    return ValidationReport(
+        rows=sum(report.rows for report in reports),
+        unmapped_codes=add_counts(report.unmapped_codes for report in reports),
+        coercion_failures=add_counts(report.coercion_failures for report in reports),
+        missing_values=add_counts(report.missing_values for report in reports),
+        day_year_mismatches=add_counts(report.day_year_mismatches for report in reports),
+        mode_total_mismatches=add_counts(report.mode_total_mismatches for report in reports),
+    )
+
+
+def _print_validation_messages(report):
+
+    """
+    Prints the problems of a ValidationReport, one line per problem, nothing when every check passed.
+    """
+
+    for message in validation_messages(report):
+        print("Validation:", message)
+
+
+@instrumented
+def validate_dataset(dataset_unnamed, rtol=0.01, day_decimals=2, total_mode='Total'):
+
+    """
+    Checks a raw CBS StatLine export for codes and values that the cleaning step would silently drop.
+
+    Args:
+        dataset_unnamed (pd.DataFrame): Raw export, for example read from '84710ENG_TypedDataSet_*.csv'.
+        rtol (float): Relative difference that is allowed between per day and per year values, and
+            between the total mode and the sum of the modes.
+        day_decimals (int): Number of decimals of the published per day values.
+        total_mode (str): Label of the travel mode that holds the total of all modes.
+
+    Returns:
+        ValidationReport: Unmapped codes per dimension, coercion failures and missing values per numeric
+            column, and the number of per day / per year and mode total mismatches.
+
+    Notes:
+        - make_named_clean_dataset builds the same report while it cleans, reusing its decoded columns,
+          use this function to check a table without cleaning it. The chunked and parallel cleaners
+          call it on every raw chunk before they filter it, and merge the reports with merge_reports.
+        - Every check is vectorised over the whole table, and the rows that failed are only visited
+          to count their distinct values.
+        - dataset_unnamed is not modified.
+    """
+
+    from .data_rename import (
+        _decode_codes,
+        column_names_mapping,
+        decode_periods,
+        margins_mapping,
+        numeric_columns,
+        population_mapping,
+        region_char_mapping,
+        travel_modes_mapping,
+        travel_motives_mapping,
+    )
+
+    data = dataset_unnamed.rename(columns=column_names_mapping)
+    raw_numeric = {col: data[col] for col in numeric_columns if col in data.columns}
+
+    # Decode and coerce the same way make_named_clean_dataset does
+    data = data.assign(
+        TravelMotives=_decode_codes(data['TravelMotivesCode'], travel_motives_mapping),
+        Population=_decode_codes(data['PopulationCode'], population_mapping),
+        TravelModes=_decode_codes(data['TravelModesCode'], travel_modes_mapping),
+        Margins=_decode_codes(data['MarginsCode'], margins_mapping),
+        RegionCharacteristics=_decode_codes(data['RegionCharacteristicsCode'], region_char_mapping),
+        Period=decode_periods(data['PeriodsCode']),
+        **{col: pd.to_numeric(raw, errors='coerce') for col, raw in raw_numeric.items()},
+    )
+
+    return _validation_report(data, raw_numeric, rtol=rtol, day_decimals=day_decimals, total_mode=total_mode)
@@ -0,0 +1,218 @@
+import os
+
+import numpy as np
+
+from .aggregate_cube import AggregateCube, as_cube, cube_dimensions
+from .instrumentation import instrumented
+
+# Measures of which the year on year change and the change against the baseline period are derived
+change_measures = ['Trips_Per_Year', 'Distance_Travelled_PassengerKm_Per_Year', 'Time_Travelled_Hours_Per_Year']
+
+# Names of the derived measures that are not per base measure
+km_per_trip = 'Km_Per_Trip'
+minutes_per_trip = 'Minutes_Per_Trip'
+speed_kmh = 'Speed_Kmh'
+trips_modal_share = 'Trips_Modal_Share'
+distance_modal_share = 'Distance_Modal_Share'
+yoy_change_suffix = '_YoY_Change'
+baseline_change_suffix = '_Change_Vs_'
+
+
+def _ratio(numerator, denominator):
+
+    """
+    Divides two arrays, cells with a zero or missing denominator become NaN.
+    """
+
+    result = np.full(np.broadcast(numerator, denominator).shape, np.nan)
+    np.divide(numerator, denominator, out=result, where=np.isfinite(denominator) & (denominator != 0))
+
+    return result
+
+
+def _is_derived_measure(name):
+
+    """
+    Tells whether a measure is one of the ratios of add_derived_metrics, which are averaged and never summed.
+    """
+
+    return (
+        name in [km_per_trip, minutes_per_trip, speed_kmh, trips_modal_share, distance_modal_share]
+        or name.endswith(yoy_change_suffix)
+        or baseline_change_suffix in name
+    )
+
+
+def _base_cube(cube):
+
+    """
+    Returns the cube without the measures of add_derived_metrics, which come after the base measures.
+    """
+
+    if km_per_trip not in cube.measures:
+        return cube
+
+    base = cube.measures.index(km_per_trip)
+    return AggregateCube(
+        sums=cube.sums[..., :base], counts=cube.counts[..., :base], labels=cube.labels, measures=cube.measures[:base]
+    )
+
+
+def _baseline_period(cube, default='2019'):
+
+    """
+    Returns the baseline period of the '_Change_Vs_<period>' measures of a cube, default when it has none.
+    """
+
+    for name in cube.measures:
+        if baseline_change_suffix in name:
+            return name.split(baseline_change_suffix, 1)[1]
+
+    return default
+
+
+@instrumented
+def add_derived_metrics(data, baseline_period='2019', total_mode='Total'):
+
+    """
+    Adds per trip, speed, modal share and change measures to the aggregate cube, in one pass over its arrays.
+
+    Args:
+        data (pd.DataFrame or AggregateCube): Cleaned mobility data or its cube from build_cube.
+        baseline_period (str): Period the '_Change_Vs_<period>' measures compare with, 2019 is the last
+            year before COVID.
+        total_mode (str): Label of the travel mode that holds the total of all modes.
+
+    Returns:
+        AggregateCube: The cube with the derived measures appended to its measures:
+            - 'Km_Per_Trip', 'Minutes_Per_Trip' and 'Speed_Kmh' (km per hour travelled), from the per
+              year measures.
+            - 'Trips_Modal_Share' and 'Distance_Modal_Share', the percentage of the total of all modes
+              in the same motive, region and period.
+            - '<measure>_YoY_Change', the percentage change against the previous period on the period
+              axis, and '<measure>_Change_Vs_<baseline_period>', for every measure in change_measures.
+
+    Notes:
+        - Every derived measure is computed per cell from the cell averages with broadcasting over the
+          mode and period axes, without grouping or looping over groups in Python.
+        - A derived value is stored as a sum with a count of 1. slice_cube always averages the derived
+          measures over the cells it combines, as summing ratios gives no meaningful value, so they can
+          be plotted with barplotanimation or sliced with where picking a single label of every
+          dimension that is not in by, for example where={'TravelMotives': 'Total'}.
+        - A cube that already has the derived measures of baseline_period is returned as it is, the
+          derived measures of another baseline are replaced.
+    """
+
+    cube = as_cube(data)
+    baseline_name = baseline_change_suffix + str(baseline_period)
+
+    if km_per_trip in cube.measures:
+        if any(name.endswith(baseline_name) for name in cube.measures):
+            return cube
+
+        # Derived for another baseline: drop every derived measure and derive them again
+        cube = _base_cube(cube)
+
+    # Average of every measure per cell, NaN for cells without data
+    values = _ratio(cube.sums, cube.counts)
+
+    def measure(name):
+        return values[..., cube.measures.index(name)]
+
+    derived = {}
+
+    # Per trip and speed measures
+    derived[km_per_trip] = _ratio(measure('Distance_Travelled_PassengerKm_Per_Year'), measure('Trips_Per_Year'))
+    derived[minutes_per_trip] = _ratio(measure('Time_Travelled_Hours_Per_Year') * 60, measure('Trips_Per_Year'))
+    derived[speed_kmh] = _ratio(measure('Distance_Travelled_PassengerKm_Per_Year'), measure('Time_Travelled_Hours_Per_Year'))
+
+    # Modal share: divide by the total mode, or the sum of the modes when there is no total
+    mode_axis = cube_dimensions.index('TravelModes')
+    mode_labels = cube.labels['TravelModes']
+    for name, source in [(trips_modal_share, 'Trips_Per_Year'), (distance_modal_share, 'Distance_Travelled_PassengerKm_Per_Year')]:
+        source_values = measure(source)
+        if total_mode in mode_labels:
+            total = np.take(source_values, [mode_labels.get_loc(total_mode)], axis=mode_axis)
+        else:
+            total = np.nansum(source_values, axis=mode_axis, keepdims=True)
+        derived[name] = 100 * _ratio(source_values, total)
+
+    # Changes along the period axis, for all change measures at once
+    period_axis = cube_dimensions.index('Period')
+    present = [name for name in change_measures if name in cube.measures]
+    changing = values[..., [cube.measures.index(name) for name in present]]
+
+    previous = np.roll(changing, 1, axis=period_axis)
+    previous[(slice(None),) * period_axis + (0,)] = np.nan
+    yoy = 100 * (_ratio(changing, previous) - 1)
+
+    period_labels = [str(label) for label in cube.labels['Period']]
+    if str(baseline_period) in period_labels:
+        baseline = np.take(changing, [period_labels.index(str(baseline_period))], axis=period_axis)
+        versus_baseline = 100 * (_ratio(changing, baseline) - 1)
+    else:
+        versus_baseline = np.full(changing.shape, np.nan)
+
+    for position, name in enumerate(present):
+        derived[name + yoy_change_suffix] = yoy[..., position]
+        derived[name + baseline_name] = versus_baseline[..., position]
+
+    # Store the derived values as sums with a count of 1, next to the base measures
+    stacked = np.stack(list(derived.values()), axis=-1)
+    valid = np.isfinite(stacked)
+
+    return AggregateCube(
+        sums=np.concatenate([cube.sums, np.where(valid, stacked, 0.0)], axis=-1),
+        counts=np.concatenate([cube.counts, valid.astype(float)], axis=-1),
+        labels=cube.labels,
+        measures=cube.measures + list(derived),
+    )
+
+
+@instrumented
+def load_derived_cube(raw_path, cache_dir="cache", baseline_period='2019'):
+
+    """
+    Loads the cube with the derived measures of a raw StatLine export, from a cache next to the cleaned data.
+
+    Args:
+        raw_path (str): Path to the raw semicolon separated '84710ENG_TypedDataSet_*.csv' file.
+        cache_dir (str): Directory of the caches, the same as for load_clean_dataset.
+        baseline_period (str): Period the change measures compare with.
+
+    Returns:
+        AggregateCube: The cube of add_derived_metrics.
+
+    Notes:
+        - The cube is stored as an uncompressed .npz file named with cache_key(raw_path), so it is
+          rebuilt together with the cleaned data cache when the raw file or the maps change.
+    """
+
+    import pandas as pd
+    from .data_cache import cache_file_prefix, cache_key, load_clean_dataset
+
+    file_prefix = cache_file_prefix + "cube_" + os.path.splitext(os.path.basename(raw_path))[0] + "_"
+    cache_path = os.path.join(cache_dir, f"{file_prefix}{cache_key(raw_path)}_{baseline_period}.npz")
+
+    # Warm start: read the arrays and labels of the cube
+    if os.path.exists(cache_path):
+        with np.load(cache_path, allow_pickle=False) as arrays:
+            labels = {dimension: pd.Index(arrays['labels_' + dimension].tolist()) for dimension in cube_dimensions}
+            return AggregateCube(
+                sums=arrays['sums'], counts=arrays['counts'], labels=labels, measures=arrays['measures'].tolist()
+            )
+
+    cube = add_derived_metrics(load_clean_dataset(raw_path, cache_dir=cache_dir), baseline_period=baseline_period)
+
+    # Remove cubes of earlier versions of the raw file or the maps
+    for file_name in os.listdir(cache_dir):
+        if file_name.startswith(file_prefix) and file_name != os.path.basename(cache_path):
+            os.remove(os.path.join(cache_dir, file_name))
+
+    # Store the labels as fixed width text, so the file loads without pickle
+    labels = {'labels_' + dimension: np.array([str(label) for label in cube.labels[dimension]]) for dimension in cube_dimensions}
+    temporary_path = cache_path + ".tmp.npz"
+    np.savez(temporary_path, sums=cube.sums, counts=cube.counts, measures=np.array(cube.measures), **labels)
+    os.replace(temporary_path, cache_path)
+
+    return cube
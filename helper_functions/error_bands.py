@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+
+from .aggregate_cube import AggregateCube, slice_cube
+from .data_rename import lower_bound_suffix, upper_bound_suffix
+from .instrumentation import instrumented
+
+# Legend labels of the bands, per cell bounds are published, combined bounds are derived from them
+cell_band_label = '95% confidence interval'
+combined_band_label = '95% interval, combined assuming independent cells'
+
+
+def _half_width_cube(cube, measure):
+
+    """
+    Returns a cube with, per cell, the squared lower and upper half-widths of the interval of measure, the
+    number of rows of measure and whether the cell has data, and whether it has both bounds.
+    """
+
+    def cell_values(name):
+        index = cube.measures.index(name)
+        values = np.full(cube.sums.shape[:-1], np.nan)
+        np.divide(cube.sums[..., index], cube.counts[..., index], out=values, where=cube.counts[..., index] > 0)
+        return values
+
+    value = cell_values(measure)
+    lower = value - cell_values(measure + lower_bound_suffix)
+    upper = cell_values(measure + upper_bound_suffix) - value
+
+    has_value = np.isfinite(value)
+    has_bounds = has_value & np.isfinite(lower) & np.isfinite(upper)
+    rows = cube.counts[..., cube.measures.index(measure)]
+
+    columns = {
+        'lower_squared': np.where(has_bounds, lower, 0.0) ** 2,
+        'upper_squared': np.where(has_bounds, upper, 0.0) ** 2,
+        'rows': rows,
+        'cells': has_value.astype(float),
+        'bounded_cells': has_bounds.astype(float),
+    }
+
+    # Every value is stored as a sum with a count of 1 on the cells with data
+    return AggregateCube(
+        sums=np.stack(list(columns.values()), axis=-1),
+        counts=np.repeat(has_value[..., np.newaxis].astype(float), len(columns), axis=-1),
+        labels=cube.labels,
+        measures=list(columns),
+    )
+
+
+@instrumented
+def slice_with_bounds(cube, measure, by, **kwargs):
+
+    """
+    Slices a measure out of the cube together with its confidence interval bounds, when the cube has them.
+
+    Args:
+        cube (AggregateCube): Cube made by build_cube.
+        measure (str): Name of the measure, for example 'Trips_Per_Year'.
+        by (list of str): Dimensions that are kept, see slice_cube.
+        **kwargs: where, exclude and statistic, passed on to slice_cube.
+
+    Returns:
+        pd.DataFrame: The output of slice_cube, with '<measure>_Lower' and '<measure>_Upper' columns when
+            the data was cleaned with confidence_intervals=True. frame.attrs['combined_bounds'] is True
+            when a row combines more than one cell.
+
+    Notes:
+        - When every row is a single cell of the cube, the bounds are the published 95% bounds.
+        - When a row sums or averages several cells (motives, modes or regions that are not fixed by
+          by or where), its bounds are the aggregate plus and minus the root of the sum of the squared
+          half-widths of its cells, divided by the number of rows for a mean. This assumes the errors
+          of the cells are independent, so it is only an approximation of a 95% interval.
+        - Rows with a cell that has a value but no bounds get no bounds.
+    """
+
+    frame = slice_cube(cube, measure, by, **kwargs)
+    frame.attrs['combined_bounds'] = False
+
+    if measure + lower_bound_suffix not in cube.measures or measure + upper_bound_suffix not in cube.measures:
+        return frame
+
+    # Sum the squared half-widths and count the cells of every row, with the same selection as the measure
+    half_widths = _half_width_cube(cube, measure)
+    slice_kwargs = {key: value for key, value in kwargs.items() if key != 'statistic'}
+    parts = slice_cube(half_widths, 'lower_squared', by, **slice_kwargs)
+    for name in half_widths.measures[1:]:
+        parts[name] = slice_cube(half_widths, name, by, **slice_kwargs)[name].to_numpy()
+    parts = frame[by].merge(parts, on=by, how='left')
+
+    lower = np.sqrt(parts['lower_squared'].to_numpy())
+    upper = np.sqrt(parts['upper_squared'].to_numpy())
+    if kwargs.get('statistic', 'sum') == 'mean':
+        lower = lower / parts['rows'].to_numpy()
+        upper = upper / parts['rows'].to_numpy()
+
+    complete = (parts['bounded_cells'] == parts['cells']).to_numpy()
+    values = frame[measure].to_numpy(dtype=float)
+    frame[measure + lower_bound_suffix] = np.where(complete, values - lower, np.nan)
+    frame[measure + upper_bound_suffix] = np.where(complete, values + upper, np.nan)
+    frame.attrs['combined_bounds'] = bool((parts['cells'] > 1).any())
+
+    return frame
+
+
+@instrumented
+def add_plotly_error_bands(fig, frame, x, y, color):
+
+    """
+    Adds a shaded confidence band around every line of a plotly express line plot.
+
+    Args:
+        fig (plotly.graph_objects.Figure): Line plot made with px.line from frame.
+        frame (pd.DataFrame): Data of the plot, with the bound columns from slice_with_bounds.
+        x (str): Column on the x-axis.
+        y (str): Column on the y-axis, the bounds are '<y>_Lower' and '<y>_Upper'.
+        color (str): Column that splits the lines.
+
+    Returns:
+        plotly.graph_objects.Figure: fig, unchanged when frame has no bound columns. The first band has a
+            legend entry that tells whether the bounds are published or combined, see slice_with_bounds.
+    """
+
+    import plotly.graph_objects as go
+
+    lower, upper = y + lower_bound_suffix, y + upper_bound_suffix
+    if lower not in frame.columns or upper not in frame.columns:
+        return fig
+
+    label = combined_band_label if frame.attrs.get('combined_bounds') else cell_band_label
+
+    for number, trace in enumerate(list(fig.data)):
+        group = frame[frame[color].astype(str) == str(trace.name)].sort_values(x)
+
+        # Go along the upper bound and back along the lower bound, and fill the polygon
+        fig.add_trace(go.Scatter(
+            x=list(group[x]) + list(group[x])[::-1],
+            y=list(group[upper]) + list(group[lower])[::-1],
+            fill='toself',
+            fillcolor=trace.line.color,
+            opacity=0.2,
+            line=dict(width=0),
+            hoverinfo='skip',
+            name=label,
+            showlegend=number == 0,
+            legendgroup=trace.legendgroup,
+        ))
+
+    return fig
+
+
+@instrumented
+def add_matplotlib_error_bands(ax, frame, x, y, hue):
+
+    """
+    Adds a shaded confidence band around every line of a seaborn line plot.
+
+    Args:
+        ax (matplotlib.axes.Axes): Axes with the line plot, made with a legend per hue value.
+        frame (pd.DataFrame): Data of the plot, with the bound columns from slice_with_bounds.
+        x (str): Column on the x-axis.
+        y (str): Column on the y-axis, the bounds are '<y>_Lower' and '<y>_Upper'.
+        hue (str): Column that splits the lines.
+
+    Returns:
+        matplotlib.axes.Axes: ax, unchanged when frame has no bound columns. The first band is labelled for
+            the legend with whether the bounds are published or combined, see slice_with_bounds.
+    """
+
+    lower, upper = y + lower_bound_suffix, y + upper_bound_suffix
+    if lower not in frame.columns or upper not in frame.columns:
+        return ax
+
+    # Use the colour of the legend entry of every line
+    handles, labels = ax.get_legend_handles_labels()
+    colors = {label: handle.get_color() for handle, label in zip(handles, labels)}
+
+    band_label = combined_band_label if frame.attrs.get('combined_bounds') else cell_band_label
+
+    for label, group in frame.groupby(hue, observed=True):
+        if str(label) in colors:
+            group = group.sort_values(x)
+            # Category labels are drawn as text on the x-axis, numbers as numbers
+            x_values = group[x] if pd.api.types.is_numeric_dtype(group[x]) else group[x].astype(str)
+            ax.fill_between(
+                x_values, group[lower], group[upper], color=colors[str(label)], alpha=0.2, linewidth=0, label=band_label
+            )
+            # Only the first band is in the legend
+            band_label = '_' + band_label
+
+    return ax
@@ -0,0 +1,192 @@
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+
+from .instrumentation import instrumented, span
+
+# Limits of the cache, change them with configure_figure_cache
+max_entries = 128
+max_bytes = 64 * 1024 * 1024
+
+# Figure JSON per key, the least recently used entry first
+_figures = OrderedDict()
+_stats = {'hits': 0, 'misses': 0, 'bytes': 0}
+_lock = threading.Lock()
+
+# Argument values that are keyed by their repr, anything else is fingerprinted
+_scalar_types = (str, bytes, int, float, complex, bool, type(None))
+
+
+@instrumented
+def data_fingerprint(data):
+
+    """
+    Computes a cheap fingerprint of the input of a helper function.
+
+    Args:
+        data (pd.DataFrame, AggregateCube or other): Data passed to a helper function.
+
+    Returns:
+        str: Hexadecimal digest that changes when the values, columns, dtypes or labels change.
+
+    Raises:
+        TypeError: When data is not a DataFrame, Series, cube or array and can not be pickled.
+
+    Notes:
+        - DataFrames and Series are hashed with pandas' vectorised hash_pandas_object, cubes and numpy
+          arrays through their raw bytes. Other values are fingerprinted through their pickle.
+        - The values are hashed on every call, so a DataFrame that is changed in place gets a new
+          fingerprint.
+    """
+
+    import numpy as np
+    import pandas as pd
+    from .aggregate_cube import AggregateCube
+
+    def digest_of(*parts):
+        digest = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            digest.update(part if isinstance(part, bytes) else repr(part).encode('utf-8'))
+        return digest.hexdigest()
+
+    if isinstance(data, pd.DataFrame):
+        check = (data.shape, list(data.columns), [str(dtype) for dtype in data.dtypes])
+        return digest_of('DataFrame', check, pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+
+    if isinstance(data, pd.Series):
+        check = (data.shape, data.name, str(data.dtype))
+        return digest_of('Series', check, pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+
+    if isinstance(data, AggregateCube):
+        check = (data.sums.shape, data.measures, {name: list(labels) for name, labels in data.labels.items()})
+        return digest_of('AggregateCube', check, data.sums.tobytes(), data.counts.tobytes())
+
+    if isinstance(data, np.ndarray):
+        check = (data.shape, str(data.dtype))
+        if data.dtype.hasobject:
+            return digest_of('ndarray', check, pickle.dumps(data.tolist()))
+        return digest_of('ndarray', check, np.ascontiguousarray(data).tobytes())
+
+    try:
+        return digest_of(type(data).__qualname__, pickle.dumps(data))
+    except (pickle.PicklingError, TypeError, AttributeError) as error:
+        raise TypeError(f"Can not fingerprint a {type(data).__name__}") from error
+
+
+def _argument_key(value):
+
+    """
+    Returns the part of a cache key of one argument: the repr of scalars, the fingerprint of anything else.
+    Lists, tuples and dicts are keyed per item.
+    """
+
+    if isinstance(value, _scalar_types):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__,) + tuple(_argument_key(item) for item in value)
+    if isinstance(value, dict):
+        return ('dict',) + tuple(sorted((repr(key), _argument_key(item)) for key, item in value.items()))
+    if callable(value) and hasattr(value, '__qualname__'):
+        return (getattr(value, '__module__', None), value.__qualname__)
+
+    return data_fingerprint(value)
+
+
+@instrumented
+def cached_figure_json(function, data, *args, **kwargs):
+
+    """
+    Returns the plotly figure JSON of a helper function, building the figure only when it is not cached.
+
+    Args:
+        function (callable): Plotly helper function, for example barplotanimation.
+        data (pd.DataFrame or AggregateCube): First argument of the function.
+        *args: Other arguments of the function.
+        **kwargs: Keyword arguments of the function, show is always False.
+
+    Returns:
+        str: The figure as plotly JSON. Functions that return several figures, like plot_travelhours,
+            give a JSON list of figures.
+
+    Notes:
+        - The key is the function, the fingerprint of data and the other arguments, so changed data
+          never returns an old figure. Scalar arguments are keyed by their repr, data arguments such
+          as DataFrames and arrays by data_fingerprint.
+        - The least recently used figures are evicted when there are more than max_entries figures or
+          their JSON takes more than max_bytes.
+        - Safe to use from several threads. Two threads that miss the same key both build the figure.
+    """
+
+    key = (function.__module__, function.__qualname__, data_fingerprint(data), _argument_key(args), _argument_key(kwargs))
+
+    with _lock:
+        if key in _figures:
+            _figures.move_to_end(key)
+            _stats['hits'] += 1
+            return _figures[key]
+        _stats['misses'] += 1
+
+    # Build the figure outside the lock, so other requests are not blocked
+    figures = function(data, *args, show=False, **kwargs)
+    with span('figure_cache.to_json'):
+        if isinstance(figures, tuple):
+            figure_json = '[' + ','.join(fig.to_json() for fig in figures) + ']'
+        else:
+            figure_json = figures.to_json()
+
+    with _lock:
+        if key not in _figures:
+            _figures[key] = figure_json
+            _stats['bytes'] += len(figure_json.encode('utf-8'))
+        _evict()
+
+    return figure_json
+
+
+def _evict():
+
+    """
+    Removes the least recently used figures until the cache is within its limits, the lock must be held.
+    """
+
+    while _figures and (len(_figures) > max_entries or _stats['bytes'] > max_bytes):
+        _, figure_json = _figures.popitem(last=False)
+        _stats['bytes'] -= len(figure_json.encode('utf-8'))
+
+
+def configure_figure_cache(entries=None, size_bytes=None):
+
+    """
+    Changes the maximum number of cached figures and the maximum total size of their JSON.
+    """
+
+    global max_entries, max_bytes
+
+    with _lock:
+        if entries is not None:
+            max_entries = entries
+        if size_bytes is not None:
+            max_bytes = size_bytes
+        _evict()
+
+
+def clear_figure_cache():
+
+    """
+    Removes every cached figure and resets the statistics.
+    """
+
+    with _lock:
+        _figures.clear()
+        _stats.update(hits=0, misses=0, bytes=0)
+
+
+def figure_cache_info():
+
+    """
+    Returns the number of hits, misses and cached figures and the total size of their JSON in bytes.
+    """
+
+    with _lock:
+        return dict(_stats, entries=len(_figures))
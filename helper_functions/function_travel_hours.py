@@ -1,29 +1,50 @@
+from .instrumentation import instrumented
+
 
 # This function defines the graphs that are used for measuring the effect of covid on travel hours over different levels of urbanisation
 
-def plot_travelhours():
-    import pandas as pd
-    import plotly.express as px
+@instrumented
+def plot_travelhours(data=None, show=True):
 
     """
     Generates visualizations to analyze the impact of COVID-19 on travel time across different urbanization levels.
 
-    This function reads travel data, groups it by urbanization level and period, and creates:
+    This function takes the cleaned travel data, groups it by urbanization level and period, and creates:
         1. A line plot showing travel time over years across urbanization levels.
         2. A heatmap displaying travel time distribution over time and urbanization levels.
 
+    Args:
+        data (pd.DataFrame, AggregateCube or callable, optional): The cleaned mobility data, a cube made
+            from it by build_cube, or a loader that returns either of them (for example a functools.partial
+            of load_clean_dataset). When None, the data is read from
+            'values_named_clean_mobility_data.csv' in the current working directory.
+        show (bool): Display both plots instead of returning them.
+
     Returns:
-        None: Displays a line plot and a heatmap.
+        tuple of plotly.graph_objects.Figure: The line plot and the heatmap. The line plot has a band when the
+            data was cleaned with confidence_intervals=True. Every line sums several motives and modes, so the
+            band combines their bounds assuming independence, see slice_with_bounds.
 
     Notes:
         - The line plot shows the yearly travel time trend by urbanization level.
         - The heatmap visualizes travel time distribution by period and region characteristics.
     """
 
-    df = pd.read_csv("values_named_clean_mobility_data.csv")
+    import pandas as pd
+    import plotly.express as px
+    from .aggregate_cube import as_cube
+    from .error_bands import add_plotly_error_bands, slice_with_bounds
+
+    # Use the given data, ask the loader for it, or fall back to the cleaned csv
+    if data is None:
+        df = pd.read_csv("values_named_clean_mobility_data.csv")
+    elif callable(data):
+        df = data()
+    else:
+        df = data
 
-    # Group the data for the line plot
-    travelmode_animation = df.groupby(['RegionCharacteristics', 'Period']).sum('Time_Travelled_Hours_Per_Year').reset_index()
+    # Group the data for the line plot, only summing the column that is plotted
+    travelmode_animation = slice_with_bounds(as_cube(df), 'Time_Travelled_Hours_Per_Year', by=['RegionCharacteristics', 'Period'])
 
     # Code for lineplot
     fig = px.line(
@@ -51,8 +72,14 @@ def plot_travelhours():
         font=dict(family="Arial", size=14)
     )
     
+    # Add the confidence bands when the bounds are available
+    add_plotly_error_bands(fig, travelmode_animation, 'Period', 'Time_Travelled_Hours_Per_Year', 'RegionCharacteristics')
+
     # Show plot
-    fig.show()
+    if show:
+        fig.show()
+
+    line_fig = fig
 
     # Code for heatmap
 
@@ -68,4 +95,8 @@ def plot_travelhours():
         title_x=0.5,)
 
     # Show plot
-    fig.show()
\ No newline at end of file
+    if show:
+        fig.show()
+        return None
+
+    return line_fig, fig
\ No newline at end of file
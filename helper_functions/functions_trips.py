@@ -1,122 +1,262 @@
-def trips_per_year_total_and_period(data):  
+from .instrumentation import instrumented
+
+
+@instrumented
+def trips_per_year_total_and_period(data, measure='Trips_Per_Year', show=True):  
 
     """
     Generates a bar plot showing total trips per year by period.
 
     Args:
-        data (pd.DataFrame): DataFrame containing 'Period', 'Trips_Per_Year', and 'TravelModes' columns.
+        data (pd.DataFrame or AggregateCube): DataFrame containing 'Period', 'Trips_Per_Year', and 'TravelModes'
+            columns, or a cube made from it by build_cube.
+        measure (str): Measure that is plotted, for example a derived measure of a cube from load_derived_cube.
+        show (bool): Display the total bar plot instead of returning it.
 
     Returns:
-        None: Displays a bar plot filtered for the 'Total' travel mode.
+        matplotlib.figure.Figure: A bar plot filtered for the 'Total' travel mode.
     """
     #importing useful libraries 
-    import pandas as pd
     import seaborn as sns
-    import plotly.express as px
     import matplotlib.pyplot as plt
+    from .aggregate_cube import as_cube, slice_cube
+
+    #Selecting the right data to visualize, averaged per bar like sns.barplot does
+    df_filtered = slice_cube(as_cube(data), measure, by=['Period', 'TravelModes'], where={'TravelModes': 'Total'}, statistic='mean')
 
-    #Selecting the right data to visualize
-    df = data
-    df_filtered = df[df['TravelModes'] == 'Total']
+    #The measure name is used as title and axis label
+    label = measure.replace('_', ' ')
 
-    #Show the plot using sns.barplot
-    sns.barplot(data=df_filtered, x='Period', y='Trips_Per_Year', hue='TravelModes', errorbar=None)
-    plt.title("Trips Per Year Total and Period")
+    #Show the plot using sns.barplot on a new figure
+    fig = plt.figure()
+    sns.barplot(data=df_filtered, x='Period', y=measure, hue='TravelModes', errorbar=None)
+    plt.title(f"{label} Total and Period")
     plt.xticks(rotation=45)
     plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0)
-    plt.show()
+    if show:
+        plt.show()
+        return None
+
+    return fig
+
 
-def trips_per_yearby_travel_mode_and_period(data):
+@instrumented
+def trips_per_yearby_travel_mode_and_period(data, measure='Trips_Per_Year', show=True):
 
     """
     Generates a bar plot showing trips per year by travel mode and period.
 
     Args:
-        data (pd.DataFrame): DataFrame containing 'Period', 'Trips_Per_Year', and 'TravelModes' columns.
+        data (pd.DataFrame or AggregateCube): DataFrame containing 'Period', 'Trips_Per_Year', and 'TravelModes'
+            columns, or a cube made from it by build_cube.
+        measure (str): Measure that is plotted, for example a derived measure of a cube from load_derived_cube.
+        show (bool): Display the bar plot per mode instead of returning it.
 
     Returns:
-        None: Displays a bar plot excluding the 'Total' travel mode.
+        matplotlib.figure.Figure: A bar plot excluding the 'Total' travel mode.
     """
 
     #importing useful libraries 
-    import pandas as pd
     import seaborn as sns
-    import plotly.express as px
     import matplotlib.pyplot as plt
+    from .aggregate_cube import as_cube, slice_cube
 
-    #Selecting the right data to visualize
-    df = data
-    df_filtered = df[df['TravelModes'] != 'Total']
+    #Selecting the right data to visualize, averaged per bar like sns.barplot does
+    df_filtered = slice_cube(as_cube(data), measure, by=['Period', 'TravelModes'], exclude={'TravelModes': 'Total'}, statistic='mean')
 
-    #Show the plot using sns.barplot
-    sns.barplot(data=df_filtered, x='Period', y='Trips_Per_Year', hue='TravelModes', errorbar=None)
-    plt.title("Trips Per Year by Travel Mode and Period")
+    #The measure name is used as title and axis label
+    label = measure.replace('_', ' ')
+
+    #Show the plot using sns.barplot on a new figure
+    fig = plt.figure()
+    sns.barplot(data=df_filtered, x='Period', y=measure, hue='TravelModes', errorbar=None)
+    plt.title(f"{label} by Travel Mode and Period")
     plt.xticks(rotation=45)
     plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0)
-    plt.show()
+    if show:
+        plt.show()
+        return None
+
+    return fig
+
 
-def line_plot_trips(data): 
+@instrumented
+def line_plot_trips(data, measure='Trips_Per_Year', show=True): 
 
     """
     Generates a line plot of trips per year by travel mode and period.
 
     Args:
-        data (pd.DataFrame): DataFrame containing 'Period', 'Trips_Per_Year', and 'TravelModes' columns.
+        data (pd.DataFrame or AggregateCube): DataFrame containing 'Period', 'Trips_Per_Year', and 'TravelModes'
+            columns, or a cube made from it by build_cube.
+        measure (str): Measure that is plotted, for example a derived measure of a cube from load_derived_cube.
+        show (bool): Display the line plot instead of returning it.
 
     Returns:
-        None: Displays a line plot excluding the 'Total' travel mode.
+        matplotlib.figure.Figure: A line plot excluding the 'Total' travel mode, with a band around every
+            mode when the data was cleaned with confidence_intervals=True. The modes average several motives
+            and regions, so the band combines their bounds assuming independence, see slice_with_bounds.
     """
     #importing useful libraries 
-    import pandas as pd
     import seaborn as sns
-    import plotly.express as px
     import matplotlib.pyplot as plt
+    from .aggregate_cube import as_cube
+    from .error_bands import add_matplotlib_error_bands, slice_with_bounds
 
-    #Selecting the right data to visualize
-    df = data
-    df_filtered = df[df['TravelModes'] != 'Total']
+    #Selecting the right data to visualize, averaged per point like sns.lineplot does
+    df_filtered = slice_with_bounds(as_cube(data), measure, by=['Period', 'TravelModes'], exclude={'TravelModes': 'Total'}, statistic='mean')
     
-    #Show the plot using sns.lineplot
-    sns.lineplot(data=df_filtered, x='Period', y='Trips_Per_Year', hue='TravelModes', errorbar=None)
-    plt.title("Trips Per Year by Travel Mode and Period")
+    #The measure name is used as title and axis label
+    label = measure.replace('_', ' ')
+
+    #Show the plot using sns.lineplot on a new figure
+    fig = plt.figure()
+    ax = sns.lineplot(data=df_filtered, x='Period', y=measure, hue='TravelModes', errorbar=None)
+    add_matplotlib_error_bands(ax, df_filtered, 'Period', measure, 'TravelModes')
+    plt.title(f"{label} by Travel Mode and Period")
     plt.xticks(rotation=45)
     plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0)
-    plt.show()
+    if show:
+        plt.show()
+        return None
+
+    return fig
 
-def area_chart_trips(data): 
+
+@instrumented
+def area_chart_trips(data, measure='Trips_Per_Year', show=True): 
 
     """
     Generates a stacked area chart of trips per year by travel mode and period.
 
     Args:
-        data (pd.DataFrame): DataFrame containing 'Period', 'Trips_Per_Year', and 'TravelModes' columns.
+        data (pd.DataFrame or AggregateCube): DataFrame containing 'Period', 'Trips_Per_Year', and 'TravelModes'
+            columns, or a cube made from it by build_cube.
+        measure (str): Measure that is plotted, for example a derived measure of a cube from load_derived_cube.
+        show (bool): Display the area chart instead of returning it.
 
     Returns:
-        None: Displays a stacked area chart showing trips per year by travel mode over time.
+        matplotlib.figure.Figure: A stacked area chart showing trips per year by travel mode over time.
     """
 
     #importing useful libraries 
-    import pandas as pd
-    import seaborn as sns
-    import plotly.express as px
     import matplotlib.pyplot as plt
+    from .aggregate_cube import as_cube, slice_cube
 
-    #Selecting the right data to visualize
-    df = data
-    df_filtered = df[df['TravelModes'] != 'Total']
-    #Summing trips per year for each mode and resetting the index
-    df_grouped = df_filtered.groupby(['Period', 'TravelModes']).agg({'Trips_Per_Year': 'sum'}).reset_index()
+    #Summing trips per year for each mode, leaving out the 'Total' travel mode
+    df_grouped = slice_cube(as_cube(data), measure, by=['Period', 'TravelModes'], exclude={'TravelModes': 'Total'})
     #Group modes together
-    df_pivot = df_grouped.pivot(index='Period', columns='TravelModes', values='Trips_Per_Year')
+    df_pivot = df_grouped.pivot(index='Period', columns='TravelModes', values=measure)
     df_pivot = df_pivot.sort_index()
 
+    #The measure name is used as title and axis label
+    label = measure.replace('_', ' ')
+
     #Plot the stacked area chart with absolute values
-    plt.figure(figsize=(10,6))
+    fig = plt.figure(figsize=(10,6))
     plt.stackplot(df_pivot.index, df_pivot.T, labels=df_pivot.columns)
-    plt.title("Trips Per Year by Travel Mode and Period")
+    plt.title(f"{label} by Travel Mode and Period")
     plt.xticks(rotation=45)
     plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0)
     plt.xlabel("Period")
-    plt.ylabel("Trips Per Year")
+    plt.ylabel(label)
     plt.tight_layout()
-    plt.show()
\ No newline at end of file
+    if show:
+        plt.show()
+        return None
+
+    return fig
+
+
+@instrumented
+def trips_report(data, measure='Trips_Per_Year', path=None, dpi=100, show=False):
+
+    """
+    Draws the four trips charts of this module as one 2 x 2 figure, from a single set of aggregates.
+
+    Args:
+        data (pd.DataFrame or AggregateCube): DataFrame containing 'Period', 'Trips_Per_Year', and 'TravelModes'
+            columns, or a cube made from it by build_cube.
+        measure (str): Measure that is plotted, for example a derived measure of a cube from load_derived_cube.
+        path (str, optional): File the figure is saved to, its extension selects the format ('png', 'svg', 'pdf').
+        dpi (int): Resolution of raster output.
+        show (bool): Display the figure through IPython instead of returning it.
+
+    Returns:
+        matplotlib.figure.Figure: The figure with the total trips bars, the bars and lines per travel mode and
+            the stacked area chart.
+
+    Notes:
+        - The cube is sliced twice (averages and sums per period and mode) and the four charts are drawn
+          from those slices, without seaborn and its per call aggregation.
+        - The figure is drawn on its own Agg canvas with the object-oriented matplotlib API, it never touches
+          pyplot's global state, so reports can be rendered from several threads at the same time.
+    """
+
+    import numpy as np
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from .aggregate_cube import as_cube, slice_cube
+    from .error_bands import add_matplotlib_error_bands, slice_with_bounds
+
+    cube = as_cube(data)
+
+    # Aggregate once: averages (with bounds when present) and sums per period and mode
+    means = slice_with_bounds(cube, measure, by=['Period', 'TravelModes'], statistic='mean')
+    sums = slice_cube(cube, measure, by=['Period', 'TravelModes'], exclude={'TravelModes': 'Total'})
+
+    mean_pivot = means.pivot(index='Period', columns='TravelModes', values=measure).sort_index()
+    total = mean_pivot['Total'] if 'Total' in mean_pivot.columns else None
+    mode_means = mean_pivot.drop(columns='Total', errors='ignore')
+    # Periods that only have the Total mode get no area, but keep their position on the shared x-axis
+    mode_sums = sums.pivot(index='Period', columns='TravelModes', values=measure).reindex(mean_pivot.index).fillna(0)
+    periods = [str(period) for period in mean_pivot.index]
+    label = measure.replace('_', ' ')
+    positions = np.arange(len(periods))
+
+    fig = Figure(figsize=(18, 11), layout='constrained')
+    FigureCanvasAgg(fig)
+    (total_ax, modes_ax), (line_ax, area_ax) = fig.subplots(2, 2)
+
+    # Total trips per period
+    if total is not None:
+        total_ax.bar(positions, total.to_numpy(), width=0.8, label='Total')
+        total_ax.legend(loc='upper left', bbox_to_anchor=(1.02, 1), borderaxespad=0)
+    total_ax.set_title(f"{label} Total and Period")
+
+    # Bars per travel mode, grouped per period
+    width = 0.8 / max(len(mode_means.columns), 1)
+    for number, mode in enumerate(mode_means.columns):
+        modes_ax.bar(positions - 0.4 + (number + 0.5) * width, mode_means[mode].to_numpy(), width=width, label=str(mode))
+    modes_ax.legend(loc='upper left', bbox_to_anchor=(1.02, 1), borderaxespad=0)
+    modes_ax.set_title(f"{label} by Travel Mode and Period")
+
+    # Line per travel mode, with the confidence bands when the data has them
+    for mode in mode_means.columns:
+        line_ax.plot(periods, mode_means[mode].to_numpy(), label=str(mode))
+    mode_frame = means[means['TravelModes'] != 'Total'].assign(Period=lambda frame: frame['Period'].astype(str))
+    add_matplotlib_error_bands(line_ax, mode_frame, 'Period', measure, 'TravelModes')
+    line_ax.legend(loc='upper left', bbox_to_anchor=(1.02, 1), borderaxespad=0)
+    line_ax.set_title(f"{label} by Travel Mode and Period")
+
+    # Stacked area of the summed trips per travel mode
+    area_ax.stackplot(positions, mode_sums.T.to_numpy(), labels=[str(mode) for mode in mode_sums.columns])
+    area_ax.legend(loc='upper left', bbox_to_anchor=(1.02, 1), borderaxespad=0)
+    area_ax.set_title(f"{label} by Travel Mode and Period")
+
+    for ax in [total_ax, modes_ax, line_ax, area_ax]:
+        ax.set_xticks(positions, periods, rotation=45)
+        ax.set_xlabel("Period")
+        ax.set_ylabel(label)
+
+    # Save in one call, straight from the Agg canvas
+    if path is not None:
+        fig.savefig(path, dpi=dpi)
+
+    # The figure is not known to pyplot, so it is displayed through IPython
+    if show:
+        from IPython.display import display
+        display(fig)
+        return None
+
+    return fig
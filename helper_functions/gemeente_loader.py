@@ -0,0 +1,41 @@
+from .instrumentation import instrumented
+
+@instrumented
+def load_gemeenten(filepath, columns=None, attributes_only=False, bbox=None, bbox_crs=None):
+
+    """
+    Loads the gemeente layer of the WijkBuurtkaart, reading only the parts that are needed.
+
+    Args:
+        filepath (str): Path to the shapefile containing municipality data.
+        columns (list of str, optional): Attribute columns to read, for example ['GM_CODE', 'STED'].
+            All columns are read when None.
+        attributes_only (bool): Only read the attribute table (.dbf) and skip every geometry.
+        bbox (tuple, optional): (minx, miny, maxx, maxy) query window, only the gemeenten that
+            intersect it are loaded.
+        bbox_crs (str or int, optional): CRS of bbox, for example 4326 for a window in longitude and
+            latitude. When None, bbox is in the CRS of the shapefile (RD New, metres).
+
+    Returns:
+        pd.DataFrame or gpd.GeoDataFrame: A DataFrame of the attributes when attributes_only is True,
+            otherwise a GeoDataFrame with the geometries.
+
+    Notes:
+        - In attribute-only mode no geometry is read or parsed, which is what joins on 'STED' or
+          'GM_CODE' need.
+        - In bbox mode GDAL uses the .sbn/.sbx spatial index files that ship with the shapefile, so only
+          the geometries inside the window are read.
+    """
+
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    # Attribute-only mode: read the dbf columns without any geometry
+    if attributes_only:
+        return gpd.read_file(filepath, columns=columns, ignore_geometry=True)
+
+    # Bbox in another CRS is passed as a GeoSeries, so geopandas reprojects it to the layer's CRS
+    if bbox is not None and bbox_crs is not None:
+        bbox = gpd.GeoSeries([box(*bbox)], crs=bbox_crs)
+
+    return gpd.read_file(filepath, columns=columns, bbox=bbox)
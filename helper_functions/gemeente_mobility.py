@@ -0,0 +1,113 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .aggregate_cube import as_cube
+from .instrumentation import instrumented
+
+# Urbanisation class of CBS StatLine per 'STED' level of the WijkBuurtkaart (1 is the most urbanised)
+sted_urbanisation = {
+    1: 'Extremely urbanised',
+    2: 'Strongly urbanised',
+    3: 'Moderately urbanised',
+    4: 'Hardly urbanised',
+    5: 'Not urbanised'
+}
+
+# values has the shape gemeente x mode x period x measure, frames caches the choropleth tables
+GemeenteMobility = namedtuple('GemeenteMobility', ['gemeenten', 'values', 'modes', 'periods', 'measures', 'frames'])
+
+
+@instrumented
+def join_mobility_to_gemeenten(data, gemeenten, motive='Total'):
+
+    """
+    Estimates the mobility of every municipality from the figures of its urbanisation class.
+
+    Args:
+        data (pd.DataFrame or AggregateCube): The cleaned mobility data, or a cube made from it by build_cube.
+        gemeenten (pd.DataFrame or str): Gemeente attributes with 'GM_CODE', 'GM_NAAM' and 'STED', or the
+            path to the shapefile, which is then read in attribute-only mode.
+        motive (str): Travel motive of the figures, 'Total' for all motives together.
+
+    Returns:
+        GemeenteMobility: Per gemeente, travel mode, period and measure the per person figure of the
+            urbanisation class of that gemeente. Gemeenten without a 'STED' level of 1 to 5 get NaN.
+
+    Notes:
+        - The join is a single np.take of the region axis of the cube with the urbanisation class of
+          every gemeente, there is no loop over gemeenten.
+        - Use mobility_frame to get the table of one mode and period for a choropleth map.
+    """
+
+    from .gemeente_loader import load_gemeenten
+
+    if isinstance(gemeenten, str):
+        gemeenten = load_gemeenten(gemeenten, columns=['GM_CODE', 'GM_NAAM', 'STED'], attributes_only=True)
+
+    cube = as_cube(data)
+    regions = cube.labels['RegionCharacteristics']
+
+    # Per person figures of the motive: the average of the rows of every cell
+    motive_position = cube.labels['TravelMotives'].get_loc(motive)
+    sums = cube.sums[motive_position]
+    counts = cube.counts[motive_position]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        per_person = np.where(counts > 0, sums / counts, np.nan)
+
+    # Region axis first and an extra NaN region at the end for gemeenten without a class
+    per_region = np.moveaxis(per_person, 1, 0)
+    per_region = np.concatenate([per_region, np.full((1,) + per_region.shape[1:], np.nan)])
+
+    # Region position of every 'STED' level 0 to 5, the NaN region when the class is not in the data
+    missing = len(regions)
+    region_by_sted = np.full(6, missing)
+    for sted, region in sted_urbanisation.items():
+        if region in regions:
+            region_by_sted[sted] = regions.get_loc(region)
+
+    sted = pd.to_numeric(gemeenten['STED'], errors='coerce').fillna(-1).to_numpy(dtype=int)
+    region_index = np.where((sted >= 0) & (sted <= 5), region_by_sted[np.clip(sted, 0, 5)], missing)
+
+    # Broadcast the figures of every class onto its gemeenten in one take
+    values = np.take(per_region, region_index, axis=0)
+
+    return GemeenteMobility(
+        gemeenten=gemeenten[['GM_CODE', 'GM_NAAM', 'STED']].reset_index(drop=True),
+        values=values,
+        modes=cube.labels['TravelModes'],
+        periods=cube.labels['Period'],
+        measures=cube.measures,
+        frames={},
+    )
+
+
+@instrumented
+def mobility_frame(joined, mode='Total', period=None, measure='Trips_Per_Year'):
+
+    """
+    Returns the table of one travel mode, period and measure per gemeente, cached for repeated maps.
+
+    Args:
+        joined (GemeenteMobility): Result of join_mobility_to_gemeenten.
+        mode (str): Travel mode, for example 'Bike'.
+        period: Period label, for example '2020'. The last period when None.
+        measure (str): Name of the measure, for example 'Trips_Per_Year'.
+
+    Returns:
+        pd.DataFrame: 'GM_CODE', 'GM_NAAM', 'STED' and the measure, one row per gemeente.
+    """
+
+    if period is None:
+        period = joined.periods[-1]
+
+    key = (mode, period, measure)
+
+    if key not in joined.frames:
+        column = joined.values[
+            :, joined.modes.get_loc(mode), joined.periods.get_loc(period), joined.measures.index(measure)
+        ]
+        joined.frames[key] = joined.gemeenten.assign(**{measure: column})
+
+    return joined.frames[key]
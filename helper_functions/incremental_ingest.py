@@ -0,0 +1,125 @@
+import os
+
+import pandas as pd
+
+from .data_rename import concat_clean, decode_period_code, iter_named_clean_chunks
+from .instrumentation import instrumented
+
+# Prefix of the part files of a store, every ingest adds one part
+store_part_prefix = "part-"
+
+
+def _store_parts(store_dir):
+
+    """
+    Returns the paths of the part files of a store, in the order they were written.
+    """
+
+    if not os.path.isdir(store_dir):
+        return []
+
+    parts = sorted(
+        file_name for file_name in os.listdir(store_dir)
+        if file_name.startswith(store_part_prefix) and file_name.endswith(".feather")
+    )
+
+    return [os.path.join(store_dir, file_name) for file_name in parts]
+
+
+@instrumented
+def load_store(store_dir):
+
+    """
+    Loads the cleaned mobility data of an incremental store.
+
+    Args:
+        store_dir (str): Directory of the store, filled by ingest_new_periods.
+
+    Returns:
+        pd.DataFrame: All ingested rows in the format of make_named_clean_dataset, empty when the
+            store has no parts yet.
+
+    Notes:
+        - Every part is memory-mapped and the parts are joined with concat_clean, so the periods stay
+          one categorical column.
+    """
+
+    import pyarrow.feather as feather
+
+    parts = [feather.read_table(path, memory_map=True).to_pandas() for path in _store_parts(store_dir)]
+
+    return concat_clean(parts)
+
+
+@instrumented
+def stored_periods(store_dir):
+
+    """
+    Returns the period labels that are already in a store, without loading its numeric columns.
+    """
+
+    import pyarrow.feather as feather
+
+    periods = set()
+    for path in _store_parts(store_dir):
+        period_column = feather.read_table(path, columns=['Period'], memory_map=True).to_pandas()['Period']
+        periods.update(period_column.dropna().unique())
+
+    return periods
+
+
+@instrumented
+def ingest_new_periods(raw_path, store_dir, cube=None, chunksize=100_000):
+
+    """
+    Cleans and stores only the periods of a raw StatLine export that are not yet in the store.
+
+    Args:
+        raw_path (str): Path to the raw semicolon separated '84710ENG_TypedDataSet_*.csv' file.
+        store_dir (str): Directory of the store, it is created when it does not exist.
+        cube (AggregateCube, optional): Cube of the data in the store, the new periods are added to it.
+        chunksize (int): Number of raw rows that are read per chunk.
+
+    Returns:
+        tuple: (new_data, cube) with the cleaned rows of the new periods and the extended cube, or the
+            given cube when there were no new periods. cube stays None when no cube was given.
+
+    Notes:
+        - Only the 'Periods' column of the raw file is scanned to find new periods, codes of any
+          frequency (JJ00 years, KW quarters, MM months) are recognised.
+        - Only the rows of the new periods are cleaned, they are written as one new part file of the
+          store. Earlier parts are never rewritten.
+        - The cube is extended with extend_cube, so the old periods are not aggregated again.
+    """
+
+    import pyarrow.feather as feather
+    from .aggregate_cube import extend_cube
+
+    # Find the period codes in the raw file whose label is not stored yet
+    raw_codes = pd.read_csv(raw_path, delimiter=';', encoding='utf-8', usecols=['Periods'], dtype=str)['Periods'].unique()
+    known = stored_periods(store_dir)
+    new_codes = [code for code in raw_codes if decode_period_code(code) not in known | {None}]
+
+    if not new_codes:
+        print("No New Periods To Ingest\n")
+        return pd.DataFrame(), cube
+
+    # Clean only the rows of the new periods
+    new_data = concat_clean(iter_named_clean_chunks(raw_path, chunksize=chunksize, period_codes=new_codes))
+
+    if new_data.empty:
+        print("No Clean Rows In The New Periods:", sorted(new_codes), "\n")
+        return new_data, cube
+
+    # Append the new periods as the next part of the store
+    os.makedirs(store_dir, exist_ok=True)
+    part_path = os.path.join(store_dir, f"{store_part_prefix}{len(_store_parts(store_dir)):05d}.feather")
+    feather.write_feather(new_data, part_path + ".tmp", compression='uncompressed')
+    os.replace(part_path + ".tmp", part_path)
+
+    print("Ingested New Periods:", list(new_data['Period'].cat.categories), new_data.shape, "\n")
+
+    if cube is not None:
+        cube = extend_cube(cube, new_data)
+
+    return new_data, cube
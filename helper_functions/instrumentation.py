@@ -0,0 +1,319 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# Instrumentation is off unless enabled here or with HELPER_FUNCTIONS_TRACE=1
+enabled = os.environ.get('HELPER_FUNCTIONS_TRACE', '') not in ('', '0')
+trace_memory = False
+
+# Finished spans of this run, in the order they ended
+_spans = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class _NullSpan:
+
+    """
+    Span returned while instrumentation is disabled, every method does nothing.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set_rows_out(self, rows):
+        pass
+
+
+_null_span = _NullSpan()
+
+
+class _Span:
+
+    """
+    Records the duration, rows and allocated bytes of one stage when it ends.
+    """
+
+    __slots__ = ('name', 'rows_in', 'rows_out', 'args', 'start', 'memory_start', 'depth')
+
+    def __init__(self, name, rows_in, args):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.args = args
+
+    def __enter__(self):
+        self.depth = getattr(_local, 'depth', 0)
+        _local.depth = self.depth + 1
+        self.memory_start = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter_ns()
+        _local.depth = self.depth
+
+        allocated = None
+        if self.memory_start is not None and tracemalloc.is_tracing():
+            allocated = tracemalloc.get_traced_memory()[0] - self.memory_start
+
+        record = {
+            'name': self.name,
+            'start_ns': self.start,
+            'duration_ns': end - self.start,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'bytes': allocated,
+            'depth': self.depth,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': self.args,
+        }
+        with _lock:
+            _spans.append(record)
+
+        return False
+
+    def set_rows_out(self, rows):
+        self.rows_out = rows
+
+
+def span(name, rows_in=None, **args):
+
+    """
+    Returns a context manager that times one stage of a helper function.
+
+    Args:
+        name (str): Name of the stage, for example 'data_rename.read_csv'.
+        rows_in (int, optional): Number of input rows of the stage.
+        **args: Extra values that are stored with the span, shown in the Chrome trace.
+
+    Returns:
+        Context manager: Call set_rows_out on it to record the number of output rows.
+
+    Notes:
+        - While instrumentation is disabled a shared object that does nothing is returned, so a
+          span costs one function call and one global lookup.
+        - Bytes are the growth of the memory traced by tracemalloc during the span, so they are only
+          recorded when instrumentation was enabled with memory=True.
+    """
+
+    if not enabled:
+        return _null_span
+
+    return _Span(name, rows_in, args)
+
+
+def _row_count(value):
+
+    """
+    Returns the number of rows of a DataFrame or Series, None for other values.
+    """
+
+    if hasattr(value, 'shape') and hasattr(value, 'index'):
+        return len(value)
+
+    return None
+
+
+def instrumented(function):
+
+    """
+    Decorator that runs every call of a public helper function in a span named after the function.
+    The rows of the first argument and of the returned value are recorded when they are DataFrames.
+    """
+
+    name = f"{function.__module__.rsplit('.', 1)[-1]}.{function.__name__}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return function(*args, **kwargs)
+
+        with _Span(name, _row_count(args[0]) if args else None, {}) as function_span:
+            result = function(*args, **kwargs)
+            function_span.set_rows_out(_row_count(result))
+
+        return result
+
+    return wrapper
+
+
+def _traced_call(traced, memory, function, *args, **kwargs):
+
+    """
+    Runs function in a worker process and returns (result, spans) with the spans it recorded there.
+    With traced False nothing is recorded and spans is empty. The parent adds the spans with _merge_spans,
+    they keep the pid and tid of the worker.
+    """
+
+    if not traced:
+        return function(*args, **kwargs), []
+
+    enable_instrumentation(memory=memory)
+    clear_spans()
+
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        # A worker runs several tasks, so it never sends a span twice
+        with _lock:
+            spans = list(_spans)
+            _spans.clear()
+
+    return result, spans
+
+
+def _merge_spans(spans):
+
+    """
+    Adds the spans of a worker process to the spans of this process.
+    """
+
+    with _lock:
+        _spans.extend(spans)
+
+
+def enable_instrumentation(memory=False):
+
+    """
+    Starts recording spans.
+
+    Args:
+        memory (bool): Also record the bytes allocated in every span. This starts tracemalloc, which
+            makes Python allocations a few times slower, so timings are less exact.
+    """
+
+    global enabled, trace_memory
+
+    enabled = True
+    trace_memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable_instrumentation():
+
+    """
+    Stops recording spans, the recorded spans are kept.
+    """
+
+    global enabled, trace_memory
+
+    enabled = False
+    if trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    trace_memory = False
+
+
+def clear_spans():
+
+    """
+    Removes all recorded spans.
+    """
+
+    with _lock:
+        _spans.clear()
+
+
+def recorded_spans():
+
+    """
+    Returns a copy of the recorded spans, one dict per span.
+    """
+
+    with _lock:
+        return list(_spans)
+
+
+def profile_summary():
+
+    """
+    Summarises the recorded spans per name.
+
+    Returns:
+        list of dict: One entry per span name with the number of calls, the total, mean and maximum
+            duration in milliseconds, the summed rows in and out and the summed allocated bytes,
+            the slowest stage first.
+    """
+
+    summary = {}
+
+    for record in recorded_spans():
+        entry = summary.setdefault(record['name'], {
+            'name': record['name'], 'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            'rows_in': None, 'rows_out': None, 'bytes': None,
+        })
+        duration_ms = record['duration_ns'] / 1e6
+        entry['calls'] += 1
+        entry['total_ms'] += duration_ms
+        entry['max_ms'] = max(entry['max_ms'], duration_ms)
+        for key in ['rows_in', 'rows_out', 'bytes']:
+            if record[key] is not None:
+                entry[key] = (entry[key] or 0) + record[key]
+
+    for entry in summary.values():
+        entry['mean_ms'] = entry['total_ms'] / entry['calls']
+
+    return sorted(summary.values(), key=lambda entry: entry['total_ms'], reverse=True)
+
+
+def print_profile_summary():
+
+    """
+    Prints the profile summary as a table.
+    """
+
+    print(f"{'Span':50s} {'Calls':>6s} {'Total ms':>10s} {'Mean ms':>10s} {'Rows in':>12s} {'Rows out':>12s} {'Bytes':>12s}")
+    for entry in profile_summary():
+        counts = ['' if entry[key] is None else f"{entry[key]:,d}" for key in ['rows_in', 'rows_out', 'bytes']]
+        print(f"{entry['name']:50s} {entry['calls']:6d} {entry['total_ms']:10.1f} {entry['mean_ms']:10.1f} "
+              f"{counts[0]:>12s} {counts[1]:>12s} {counts[2]:>12s}")
+    print()
+
+
+def write_chrome_trace(path):
+
+    """
+    Writes the recorded spans as a Chrome trace, open it in chrome://tracing or https://ui.perfetto.dev.
+
+    Args:
+        path (str): Path of the JSON file.
+
+    Returns:
+        int: Number of spans written.
+
+    Notes:
+        - Spans of the worker processes of render_report and clean_shards are included, every process
+          gets its own row. The start times of all processes come from the same monotonic clock on
+          Linux, on other platforms the workers may be shifted in time.
+    """
+
+    spans = recorded_spans()
+    events = []
+
+    for record in spans:
+        args = {key: record[key] for key in ['rows_in', 'rows_out', 'bytes'] if record[key] is not None}
+        args.update({key: str(value) for key, value in record['args'].items()})
+        events.append({
+            'name': record['name'],
+            'ph': 'X',
+            'ts': record['start_ns'] / 1000,
+            'dur': record['duration_ns'] / 1000,
+            'pid': record['pid'],
+            'tid': record['tid'],
+            'args': args,
+        })
+
+    with open(path, 'w', encoding='utf-8') as trace_file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
+
+    return len(events)
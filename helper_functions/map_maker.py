@@ -1,45 +1,165 @@
-def generate_map(filepath):
+import hashlib
+import json
+import os
+
+from .instrumentation import instrumented, span
+
+# Properties of the gemeenten that are kept in the simplified GeoJSON
+map_properties = ['GM_CODE', 'GM_NAAM', 'STED']
+
+# Simplified GeoJSON per cache file, so it is read from disk only once per session
+_geojson_by_path = {}
+
+# Key per shapefile and its file stats, so an unchanged shapefile is not hashed twice in one session
+_key_by_file = {}
+
+
+def _shapefile_key(filepath, tolerance, precision):
 
     """
-    Generates a choropleth map visualizing urbanization levels across municipalities.
+    Returns a hash of the shapefile, its attribute and projection files and the simplification settings.
+    The files are only hashed again when the path, modification time or size of one of them changes.
+    """
+
+    base_path = os.path.splitext(os.path.abspath(filepath))[0]
+    part_paths = [base_path + extension for extension in ['.shp', '.dbf', '.prj'] if os.path.exists(base_path + extension)]
+
+    stats = [os.stat(path) for path in part_paths]
+    file_id = (tuple((path, stat.st_mtime_ns, stat.st_size) for path, stat in zip(part_paths, stats)), tolerance, precision)
+
+    if file_id in _key_by_file:
+        return _key_by_file[file_id]
+
+    digest = hashlib.sha256()
+
+    for part_path in part_paths:
+        with open(part_path, 'rb') as part_file:
+            for block in iter(lambda: part_file.read(1 << 20), b''):
+                digest.update(block)
+
+    # The CRS assumed for a shapefile without one is part of the key, older caches assumed another one
+    digest.update(json.dumps([map_properties, tolerance, precision, 'EPSG:28992']).encode('utf-8'))
+
+    key = digest.hexdigest()
+    _key_by_file[file_id] = key
+
+    return key
+
+
+@instrumented
+def build_simplified_geojson(filepath, tolerance=100, precision=5, cache_dir="cache"):
+
+    """
+    Builds a compact, simplified GeoJSON of the municipalities and caches it on disk.
 
     Args:
         filepath (str): Path to the shapefile containing municipality data.
+        tolerance (float): Simplification tolerance in metres. 0 keeps the full geometry.
+        precision (int): Number of decimals of the EPSG:4326 coordinates that are kept.
+        cache_dir (str): Directory in which the GeoJSON files are stored.
 
     Returns:
-        None: Displays an interactive map of municipalities with urbanization levels.
+        dict: GeoJSON FeatureCollection with 'GM_CODE' as feature id and only the 'GM_CODE', 'GM_NAAM'
+            and 'STED' properties, for gemeenten with a 'STED' value between 0 and 5.
 
     Notes:
-        - Loads municipality data, sets and converts the coordinate reference system (CRS) if needed.
-        - Fills missing urbanization ('STED') values with 0, filters for values between 0 and 5.
-        - Converts the GeoDataFrame to GeoJSON for use with Plotly.
-        - Creates a choropleth map with hover data, custom color scale, and integer ticks for urbanization levels.
-        - Centers the map on the Netherlands with a title.
+        - Neighbouring gemeenten share their simplified borders (coverage simplification), so no gaps
+          or overlaps appear. Older geopandas versions fall back to per-gemeente topology preserving
+          simplification.
+        - Geometries are simplified in a projected CRS before they are reprojected to EPSG:4326, which
+          happens once. A shapefile without a CRS is taken to be RD New (EPSG:28992), like the CBS gemeente
+          layer, and a shapefile in degrees is projected to RD New to be simplified.
+        - The cache file name contains a hash of the shapefile and the settings, a changed shapefile or
+          tolerance builds a new file.
     """
 
-    import pandas as pd
-    import geopandas as gpd
-    import matplotlib.pyplot as plt
-    import plotly.express as px
-    import json
+    from .gemeente_loader import load_gemeenten
 
-    # Load Gemeenten shapefile
-    gemeenten = gpd.read_file(filepath)
+    file_name = "gemeenten_" + os.path.splitext(os.path.basename(filepath))[0]
+    cache_path = os.path.join(cache_dir, f"{file_name}_{_shapefile_key(filepath, tolerance, precision)}.geojson")
 
-    # Set CRS if not defined and convert to EPSG:4326 that is needed for chloropleth map
+    if cache_path in _geojson_by_path:
+        return _geojson_by_path[cache_path]
+
+    # Warm start: read the cached GeoJSON
+    if os.path.exists(cache_path):
+        with open(cache_path, encoding='utf-8') as geojson_file:
+            _geojson_by_path[cache_path] = json.load(geojson_file)
+        return _geojson_by_path[cache_path]
+
+    # Only load the properties that end up in the map
+    gemeenten = load_gemeenten(filepath, columns=map_properties)
+
+    # The CBS gemeente layer is in RD New, which is assumed when the CRS is not defined
     if gemeenten.crs is None:
-        gemeenten = gemeenten.set_crs(epsg=4326)
-    gemeenten = gemeenten.to_crs(epsg=4326)
+        gemeenten = gemeenten.set_crs(epsg=28992)
 
     # Filter gemeenten based on 'STED' values between 0 and 5 inclusive
-    gemeenten_filtered = gemeenten[(gemeenten['STED'] >= 0) & (gemeenten['STED'] <= 5)].copy()
+    gemeenten = gemeenten[(gemeenten['STED'] >= 0) & (gemeenten['STED'] <= 5)]
+
+    # Simplify in metres, keeping shared borders identical
+    if tolerance:
+        if not gemeenten.crs.is_projected:
+            gemeenten = gemeenten.to_crs(epsg=28992)
+        with span('map_maker.simplify', rows_in=len(gemeenten)):
+            if hasattr(gemeenten.geometry, 'simplify_coverage'):
+                simplified = gemeenten.geometry.simplify_coverage(tolerance)
+            else:
+                simplified = gemeenten.geometry.simplify(tolerance, preserve_topology=True)
+        gemeenten = gemeenten.set_geometry(simplified)
+
+    # Convert once to EPSG:4326 that is needed for chloropleth map and round the coordinates
+    gemeenten = gemeenten.to_crs(epsg=4326)
+    gemeenten = gemeenten.set_geometry(gemeenten.geometry.set_precision(10 ** -precision))
+
+    # Use 'GM_CODE' as the id of every feature
+    with span('map_maker.geojson_to_json', rows_in=len(gemeenten)):
+        geojson_text = gemeenten.set_index('GM_CODE', drop=False)[map_properties + ['geometry']].to_json(
+            drop_id=False, separators=(',', ':')
+        )
+
+    os.makedirs(cache_dir, exist_ok=True)
+    temporary_path = cache_path + ".tmp"
+    with open(temporary_path, 'w', encoding='utf-8') as geojson_file:
+        geojson_file.write(geojson_text)
+    os.replace(temporary_path, cache_path)
+
+    _geojson_by_path[cache_path] = json.loads(geojson_text)
+
+    return _geojson_by_path[cache_path]
 
-    # Convert GeoDataFrame to GeoJSON
-    gemeenten_geojson = json.loads(gemeenten_filtered.to_json())
 
-    # Assign 'GM_CODE' as 'id' for each GeoJSON feature
-    for feature in gemeenten_geojson['features']:
-        feature['id'] = feature['properties']['GM_CODE']
+@instrumented
+def generate_map(filepath, show=True, tolerance=100, cache_dir="cache"):
+
+    """
+    Generates a choropleth map visualizing urbanization levels across municipalities.
+
+    Args:
+        filepath (str): Path to the shapefile containing municipality data.
+        show (bool): Display the map instead of returning it.
+        tolerance (float): Simplification tolerance in metres, see build_simplified_geojson.
+        cache_dir (str): Directory in which the simplified GeoJSON is cached.
+
+    Returns:
+        plotly.graph_objects.Figure: An interactive map of municipalities with urbanization levels.
+
+    Notes:
+        - Loads the simplified municipality GeoJSON from build_simplified_geojson, which is only built
+          from the shapefile the first time.
+        - Filters for 'STED' values between 0 and 5.
+        - Creates a choropleth map with hover data, custom color scale, and integer ticks for urbanization levels.
+        - Centers the map on the Netherlands with a title.
+    """
+
+    import pandas as pd
+    import plotly.express as px
+
+    # Load the simplified GeoJSON of the gemeenten
+    gemeenten_geojson = build_simplified_geojson(filepath, tolerance=tolerance, cache_dir=cache_dir)
+
+    # Table of the properties, one row per feature
+    gemeenten_filtered = pd.DataFrame([feature['properties'] for feature in gemeenten_geojson['features']])
 
     # Create the choropleth map with plotly
     fig = px.choropleth_mapbox(
@@ -82,4 +202,73 @@ def generate_map(filepath):
     )
 
     # Display the interactive map
-    fig.show()
+    if show:
+        fig.show()
+        return None
+
+    return fig
+
+
+@instrumented
+def generate_mobility_map(filepath, joined, mode='Total', period=None, measure='Trips_Per_Year', show=True,
+                          tolerance=100, cache_dir="cache"):
+
+    """
+    Generates a choropleth map of the estimated mobility per municipality for one travel mode and period.
+
+    Args:
+        filepath (str): Path to the shapefile containing municipality data.
+        joined (GemeenteMobility): Result of join_mobility_to_gemeenten, reused for every mode and period.
+        mode (str): Travel mode, for example 'Bike'.
+        period: Period label, for example '2020'. The last period when None.
+        measure (str): Name of the measure, for example 'Trips_Per_Year'.
+        show (bool): Display the choropleth instead of returning it.
+        tolerance (float): Simplification tolerance in metres, see build_simplified_geojson.
+        cache_dir (str): Directory in which the simplified GeoJSON is cached.
+
+    Returns:
+        plotly.graph_objects.Figure: An interactive map with the figure of the urbanisation class of every
+            municipality.
+    """
+
+    import plotly.express as px
+    from .gemeente_mobility import mobility_frame
+
+    # Load the simplified GeoJSON and the cached table of this mode and period
+    gemeenten_geojson = build_simplified_geojson(filepath, tolerance=tolerance, cache_dir=cache_dir)
+    gemeenten_mobility = mobility_frame(joined, mode=mode, period=period, measure=measure)
+
+    if period is None:
+        period = joined.periods[-1]
+
+    # Create the choropleth map with plotly
+    fig = px.choropleth_mapbox(
+        gemeenten_mobility.dropna(subset=[measure]),
+        geojson=gemeenten_geojson,
+        locations='GM_CODE',
+        color=measure,
+        hover_name='GM_NAAM',
+        hover_data={'STED': True, 'GM_CODE': False},
+        color_continuous_scale=px.colors.sequential.OrRd,
+        mapbox_style='carto-positron',
+        zoom=6,
+        center={"lat": 52.1326, "lon": 5.2913},
+        opacity=0.8,
+        labels={'STED': 'Urbanisation Level'},
+        height=800,
+        width=800
+    )
+
+    # Add a centered title and adjust layout
+    fig.update_layout(
+        title_text=f'{measure} ({mode}) per Municipality in {period}',
+        title_x=0.5,
+        margin={"r":0, "t":50, "l":0, "b":0},
+    )
+
+    # Display the interactive map
+    if show:
+        fig.show()
+        return None
+
+    return fig
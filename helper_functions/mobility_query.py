@@ -0,0 +1,185 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .aggregate_cube import (
+    AggregateCube,
+    _dimension_codes,
+    _label_positions,
+    cube_dimensions,
+    dimension_orders,
+    slice_cube,
+)
+from .instrumentation import instrumented
+
+# data is the indexed table, codes and labels hold the integer codes and labels of every dimension and
+# postings per dimension the (rows, offsets) pair: the rows of label i are rows[offsets[i]:offsets[i + 1]],
+# and rows the sorted, read-only positions of every indexed row
+MobilityIndex = namedtuple('MobilityIndex', ['data', 'codes', 'labels', 'postings', 'rows'])
+
+
+@instrumented
+def build_index(data):
+
+    """
+    Builds per-dimension posting lists over the cleaned mobility table, so queries only visit matching rows.
+
+    Args:
+        data (pd.DataFrame): Cleaned DataFrame with 'TravelMotives', 'TravelModes', 'RegionCharacteristics',
+            'Period' and the numeric measure columns.
+
+    Returns:
+        MobilityIndex: The table with the codes, labels and posting lists of every dimension.
+
+    Notes:
+        - Only rows of 'Population 6 years or older' with 'Value' margins are indexed, when those columns
+          exist, and rows with a missing dimension label are left out, like build_cube does.
+        - The posting list of every label is sorted by row, it is built with one stable argsort per dimension.
+        - data is only read, never modified or copied.
+    """
+
+    # Rows that take part in queries, the same rows that build_cube aggregates
+    mask = np.ones(len(data), dtype=bool)
+    if 'Population' in data.columns:
+        mask &= (data['Population'] == 'Population 6 years or older').to_numpy()
+    if 'Margins' in data.columns:
+        mask &= (data['Margins'] == 'Value').to_numpy()
+
+    codes = {}
+    labels = {}
+    for dimension in cube_dimensions:
+        codes[dimension], labels[dimension] = _dimension_codes(data[dimension], dimension_orders.get(dimension))
+        mask &= codes[dimension] >= 0
+
+    rows = np.flatnonzero(mask)
+    rows.flags.writeable = False
+
+    # Group the rows by label, keeping them in row order within every label
+    postings = {}
+    for dimension in cube_dimensions:
+        row_codes = codes[dimension][rows]
+        order = np.argsort(row_codes, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(row_codes, minlength=len(labels[dimension])))])
+        postings[dimension] = (rows[order], offsets)
+
+    return MobilityIndex(data=data, codes=codes, labels=labels, postings=postings, rows=rows)
+
+
+def _posting_rows(index, dimension, positions):
+
+    """
+    Returns the sorted rows of the labels at positions on one dimension, read from its posting lists.
+    """
+
+    rows, offsets = index.postings[dimension]
+    parts = [rows[offsets[position]:offsets[position + 1]] for position in positions]
+
+    if len(parts) == 1:
+        return parts[0]
+
+    return np.sort(np.concatenate(parts)) if parts else rows[:0]
+
+
+@instrumented
+def select_rows(index, where=None, exclude=None):
+
+    """
+    Returns the positions of the rows that match the filters, without scanning the whole table.
+
+    Args:
+        index (MobilityIndex): Index made by build_index.
+        where (dict, optional): Per dimension the label or labels that are kept.
+        exclude (dict, optional): Per dimension the label or labels that are left out.
+
+    Returns:
+        np.ndarray: Sorted row positions in index.data.
+
+    Notes:
+        - The rows of the most selective where dimension are read from its posting lists, the other
+          filters are checked on those rows only, so a selective query visits only a few rows.
+        - Without where filters every indexed row is a candidate, read from the sorted rows of the index.
+        - The returned array may be index.rows itself, which is read-only.
+    """
+
+    where = where or {}
+    exclude = exclude or {}
+
+    # Label positions that are kept per filtered dimension
+    kept = {dimension: _label_positions(index.labels[dimension], values) for dimension, values in where.items()}
+
+    if kept:
+        # Start from the dimension with the fewest rows
+        sizes = {dimension: np.diff(index.postings[dimension][1])[positions].sum() for dimension, positions in kept.items()}
+        first = min(sizes, key=sizes.get)
+        rows = _posting_rows(index, first, kept.pop(first))
+    else:
+        rows = index.rows
+
+    # Check the other filters on the candidate rows only
+    for dimension, positions in kept.items():
+        rows = rows[np.isin(index.codes[dimension][rows], positions)]
+
+    for dimension, values in exclude.items():
+        positions = _label_positions(index.labels[dimension], values)
+        rows = rows[~np.isin(index.codes[dimension][rows], positions)]
+
+    return rows
+
+
+@instrumented
+def query(source, measure, by=None, where=None, exclude=None, statistic='sum'):
+
+    """
+    Selects one measure of the cleaned mobility data, optionally aggregated per group.
+
+    Args:
+        source (MobilityIndex, pd.DataFrame or AggregateCube): Data to query. An index is built for a
+            DataFrame, build it once with build_index when the same table is queried several times.
+        measure (str): Name of the measure, for example 'Trips_Per_Year'.
+        by (list of str, optional): Dimensions to group by. When None the matching rows are returned.
+        where (dict, optional): Per dimension the label or labels that are kept.
+        exclude (dict, optional): Per dimension the label or labels that are left out.
+        statistic (str): 'sum' for the sum of the rows of every group, 'mean' for their average.
+
+    Returns:
+        pd.DataFrame: With by, one row per group that has data in the format of slice_cube. Without by,
+            the matching rows with the dimension columns and the measure.
+
+    Notes:
+        - A cube is sliced with slice_cube, so every source gives the same groups and values.
+        - Missing values of the measure are skipped, like in pandas.
+    """
+
+    if isinstance(source, AggregateCube):
+        if by is None:
+            raise ValueError("A cube only holds aggregates, pass by to query it")
+        return slice_cube(source, measure, by, where=where, exclude=exclude, statistic=statistic)
+
+    index = source if isinstance(source, MobilityIndex) else build_index(source)
+    rows = select_rows(index, where=where, exclude=exclude)
+
+    if by is None:
+        return index.data.iloc[rows][cube_dimensions + [measure]]
+
+    # Group number of every selected row and one bincount for the sums and the counts
+    shape = tuple(len(index.labels[dimension]) for dimension in by)
+    groups = np.ravel_multi_index([index.codes[dimension][rows] for dimension in by], shape)
+    values = index.data[measure].to_numpy()[rows].astype(float)
+    valid = ~np.isnan(values)
+
+    n_groups = int(np.prod(shape))
+    sums = np.bincount(groups, weights=np.where(valid, values, 0.0), minlength=n_groups)
+    counts = np.bincount(groups, weights=valid, minlength=n_groups)
+
+    # Only keep the groups that have data
+    found = np.flatnonzero(counts > 0)
+    values = sums[found] / counts[found] if statistic == 'mean' else sums[found]
+
+    result = {}
+    for dimension, positions in zip(by, np.unravel_index(found, shape)):
+        group_labels = pd.Categorical.from_codes(positions, categories=index.labels[dimension], ordered=True)
+        result[dimension] = group_labels.remove_unused_categories()
+    result[measure] = values
+
+    return pd.DataFrame(result)
@@ -0,0 +1,144 @@
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from .data_rename import concat_clean, iter_named_clean_chunks
+from . import instrumentation
+from .instrumentation import _merge_spans, _traced_call, instrumented, span
+
+
+def _to_columns(frame):
+
+    """
+    Splits a cleaned table into plain numpy arrays, so it crosses the process boundary as raw buffers.
+    A categorical column becomes (codes, categories, ordered) and any other column its values.
+    """
+
+    columns = []
+
+    for col in frame.columns:
+        values = frame[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            columns.append((col, (values.cat.codes.to_numpy(), list(values.cat.categories), values.cat.ordered)))
+        else:
+            columns.append((col, values.to_numpy()))
+
+    return columns
+
+
+def _from_columns(columns):
+
+    """
+    Rebuilds the cleaned table of _to_columns, without copying the arrays.
+    """
+
+    data = {}
+
+    for col, values in columns:
+        if isinstance(values, tuple):
+            codes, categories, ordered = values
+            data[col] = pd.Categorical.from_codes(codes, categories=categories, ordered=ordered)
+        else:
+            data[col] = values
+
+    return pd.DataFrame(data, copy=False)
+
+
+def clean_shard(path, chunksize=100_000, period_codes=None, validate=False):
+
+    """
+    Cleans one raw shard in a worker process and returns its columns, see _to_columns, and, with validate,
+    the merged ValidationReport of its chunks, otherwise None. The columns are None when no row is kept.
+    """
+
+    reports = [] if validate else None
+    clean_data = concat_clean(
+        iter_named_clean_chunks(path, chunksize=chunksize, period_codes=period_codes, reports=reports)
+    )
+
+    report = None
+    if validate:
+        from .data_validation import merge_reports
+        report = merge_reports(reports)
+
+    if clean_data.empty:
+        return None, report
+
+    return _to_columns(clean_data), report
+
+
+@instrumented
+def clean_shards(paths, max_workers=None, chunksize=100_000, period_codes=None, validate=False,
+                 return_report=False):
+
+    """
+    Cleans many raw StatLine exports in parallel over a process pool and merges them into one table.
+
+    Args:
+        paths (list of str): Paths to raw semicolon separated '84710ENG_TypedDataSet_*.csv' shards, for
+            example one per region or vintage.
+        max_workers (int, optional): Number of worker processes, defaults to the number of cores. With
+            one worker, or one shard, the shards are cleaned in this process.
+        chunksize (int): Number of raw rows that a worker reads per chunk, see iter_named_clean_chunks.
+        period_codes (list of str, optional): Only clean the rows of these period codes.
+        validate (bool): Check the raw rows of every shard before they are filtered and print the
+            problems of the merged report, see make_named_clean_dataset.
+        return_report (bool): Also return the merged ValidationReport of all shards, its checks run
+            without printing them when validate is False.
+
+    Returns:
+        pd.DataFrame: The cleaned rows of all shards, in the same format as make_named_clean_dataset.
+            With return_report a tuple of the DataFrame and the ValidationReport.
+
+    Notes:
+        - Every worker reads and cleans its own shard, only the path is sent to it. The cleaned table
+          comes back as category codes and numeric numpy arrays, never as object columns, and the
+          labels are sent once per column instead of once per row.
+        - The result is deterministic: the rows follow the order of paths and, within a shard, the
+          order of its file, however the shards are scheduled. It equals cleaning the shards one by
+          one and joining them with concat_clean.
+        - Rows are not deduplicated, a figure that is in two shards is in the result twice.
+        - Workers are started with spawn, so call this function under if __name__ == '__main__' in a script.
+        - While instrumentation is enabled, the spans of every worker are sent back with its shard and
+          added to the spans of this process.
+    """
+
+    paths = list(paths)
+    check = validate or return_report
+    workers = min(max_workers or os.cpu_count() or 1, max(len(paths), 1))
+
+    if workers == 1:
+        shards = [clean_shard(path, chunksize=chunksize, period_codes=period_codes, validate=check) for path in paths]
+    else:
+        # map returns the shards in the order of paths, whichever worker finishes first
+        traced_clean_shard = functools.partial(
+            _traced_call, instrumentation.enabled, instrumentation.trace_memory, clean_shard
+        )
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            shards = []
+            for shard, spans in executor.map(
+                traced_clean_shard, paths, [chunksize] * len(paths), [period_codes] * len(paths), [check] * len(paths)
+            ):
+                shards.append(shard)
+                _merge_spans(spans)
+
+    with span('parallel_clean.merge', rows_in=len(paths)) as merge_span:
+        clean_data = concat_clean(_from_columns(columns) for columns, _ in shards if columns is not None)
+        merge_span.set_rows_out(len(clean_data))
+
+    if not check:
+        return clean_data
+
+    from .data_validation import _print_validation_messages, merge_reports
+    report = merge_reports(report for _, report in shards)
+
+    if validate:
+        _print_validation_messages(report)
+
+    if return_report:
+        return clean_data, report
+
+    return clean_data
@@ -1,41 +1,55 @@
-import pandas as pd
-import plotly.express as px
+from .aggregate_cube import as_cube, slice_cube
+from .error_bands import add_plotly_error_bands, slice_with_bounds
+from .instrumentation import instrumented
 
-def passenger_km_plot(df):
+@instrumented
+def passenger_km_plot(df, measure='Distance_Travelled_PassengerKm_Per_Year', show=True):
     
     """
     Generates a line plot showing passenger kilometers traveled per year by urbanization level.
 
     Args:
-        df (pd.DataFrame): DataFrame containing 'Period', 'Population', 'TravelMotives', 
-            'TravelModes', 'Margins', 'RegionCharacteristics', and 'Distance_Travelled_PassengerKm_Per_Year' columns.
+        df (pd.DataFrame or AggregateCube): DataFrame containing 'Period', 'Population', 'TravelMotives', 
+            'TravelModes', 'Margins', 'RegionCharacteristics', and 'Distance_Travelled_PassengerKm_Per_Year' columns,
+            or a cube made from it by build_cube.
+        measure (str): Measure that is plotted, for example a derived measure of a cube from load_derived_cube.
+        show (bool): Display the line plot instead of returning it.
 
     Returns:
-        None: Displays a line plot for passenger kilometers per year by urbanization level.
+        plotly.graph_objects.Figure: A line plot for passenger kilometers per year by urbanization level, with
+            a 95% confidence band when the data was cleaned with confidence_intervals=True.
     """
-    # Select data that is needed for the plot.
-    df_total = df[
-        (df['Population'] == 'Population 6 years or older') &
-        (df['TravelMotives'] == 'Total') &
-        (df['TravelModes'] == 'Total') &
-        (df['Margins'] == 'Value')
-    ].copy()
-
-    # Concvert columns to numeric
-    df_total['Period'] = pd.to_numeric(df_total['Period'])
-    df_fig = df_total[['Period', 'RegionCharacteristics', 'Distance_Travelled_PassengerKm_Per_Year']]
+
+    import plotly.express as px
+
+    # Select data that is needed for the plot from the aggregate cube.
+    df_total = slice_with_bounds(
+        as_cube(df), measure, by=['RegionCharacteristics', 'Period'],
+        where={'TravelMotives': 'Total', 'TravelModes': 'Total'}
+    )
+
+    # Sort on the order of the period categories, then plot the labels as text
+    df_total = df_total.sort_values('Period')
+    df_total['Period'] = df_total['Period'].astype(str)
+    df_fig = df_total
+
+    # Other measures are titled with their name
+    if measure == 'Distance_Travelled_PassengerKm_Per_Year':
+        label, title = 'Passenger Kilometers per Year', 'Passenger Kilometers'
+    else:
+        label = title = measure.replace('_', ' ')
 
     # Define the plot
     fig = px.line(
         df_fig,
         x='Period',
-        y='Distance_Travelled_PassengerKm_Per_Year',
+        y=measure,
         color='RegionCharacteristics',
         markers=True,
-        title='Passenger Kilometers Over Time by Urbanization Level',
+        title=f'{title} Over Time by Urbanization Level',
         labels={
             'Period': 'Year',
-            'Distance_Travelled_PassengerKm_Per_Year': 'Passenger Kilometers per Year',
+            measure: label,
             'RegionCharacteristics': 'Urbanization Level'
         }
     )
@@ -47,46 +61,64 @@ def passenger_km_plot(df):
         margin=dict(t=50, b=50, l=50, r=50)
     )
 
+    # Add the confidence bands when the bounds are available
+    add_plotly_error_bands(fig, df_fig, 'Period', measure, 'RegionCharacteristics')
+
     # Show plot
-    fig.show()
+    if show:
+        fig.show()
+        return None
 
-def passenger_prop_plot(df):
+    return fig
+
+@instrumented
+def passenger_prop_plot(df, measure='Distance_Travelled_PassengerKm_Per_Day', show=True):
 
     """
     Generates an area plot showing the proportion of passenger kilometers traveled per day by urbanization level over time.
 
     Args:
-        df (pd.DataFrame): DataFrame containing 'Period', 'Population', 'TravelMotives', 
-            'TravelModes', 'Margins', 'RegionCharacteristics', and 'Distance_Travelled_PassengerKm_Per_Day' columns.
+        df (pd.DataFrame or AggregateCube): DataFrame containing 'Period', 'Population', 'TravelMotives', 
+            'TravelModes', 'Margins', 'RegionCharacteristics', and 'Distance_Travelled_PassengerKm_Per_Day' columns,
+            or a cube made from it by build_cube.
+        measure (str): Measure that is plotted, for example a derived measure of a cube from load_derived_cube.
+        show (bool): Display the area plot instead of returning it.
 
     Returns:
-        None: Displays an area plot for passenger kilometers per day by urbanization level.
+        plotly.graph_objects.Figure: An area plot for passenger kilometers per day by urbanization level.
     """
 
-    # Select data
-    df_total = df[
-        (df['Population'] == 'Population 6 years or older') &
-        (df['TravelMotives'] == 'Total') &
-        (df['TravelModes'] == 'Total') &
-        (df['Margins'] == 'Value')
-    ].copy()
+    import plotly.express as px
+
+    # Select data from the aggregate cube
+    df_total = slice_cube(
+        as_cube(df), measure, by=['RegionCharacteristics', 'Period'],
+        where={'TravelMotives': 'Total', 'TravelModes': 'Total'}
+    )
 
-    # Convert to numeric
-    df_total['Period'] = pd.to_numeric(df_total['Period'])
+    # Sort on the order of the period categories, then plot the labels as text
+    df_total = df_total.sort_values('Period')
+    df_total['Period'] = df_total['Period'].astype(str)
 
     # Select data
-    df_fig = df_total[['Period', 'RegionCharacteristics', 'Distance_Travelled_PassengerKm_Per_Day']]
+    df_fig = df_total[['Period', 'RegionCharacteristics', measure]]
+
+    # Other measures are titled with their name
+    if measure == 'Distance_Travelled_PassengerKm_Per_Day':
+        label, title = 'Passenger Kilometers per Day', 'Passenger Kilometers'
+    else:
+        label = title = measure.replace('_', ' ')
 
     # Define plot
     fig2 = px.area(
         df_fig,
         x='Period',
-        y='Distance_Travelled_PassengerKm_Per_Day',
+        y=measure,
         color='RegionCharacteristics',
-        title='Proportion of Passenger Kilometers by Urbanization Level Over Time',
+        title=f'Proportion of {title} by Urbanization Level Over Time',
         labels={
             'Period': 'Year',
-            'Distance_Travelled_PassengerKm_Per_Day': 'Passenger Kilometers per Day',
+            measure: label,
             'RegionCharacteristics': 'Urbanization Level'
         }
     )
@@ -98,4 +130,8 @@ def passenger_prop_plot(df):
         margin=dict(t=50, b=50, l=50, r=50),
         xaxis=dict(tickformat="%Y") 
     )
-    fig2.show()
\ No newline at end of file
+    if show:
+        fig2.show()
+        return None
+
+    return fig2
\ No newline at end of file
@@ -0,0 +1,183 @@
+import csv
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .instrumentation import instrumented
+
+# codes holds the raw codes of a dimension and labels their titles, in the same order
+DimensionLookup = namedtuple('DimensionLookup', ['codes', 'labels'])
+
+# dimensions holds a DimensionLookup per dimension key, topics per topic key its title, unit and group
+StatLineMetadata = namedtuple('StatLineMetadata', ['identifier', 'title', 'dimensions', 'topics'])
+
+# Remember the metadata of every file, so an unchanged file is parsed only once per session
+_metadata_by_file = {}
+
+
+def compile_lookup(mapping):
+
+    """
+    Compiles a code to label dict, for example travel_modes_mapping, into a DimensionLookup.
+    """
+
+    return DimensionLookup(codes=pd.Index(list(mapping.keys())), labels=pd.Index(list(mapping.values())))
+
+
+def decode_with_lookup(codes, lookup):
+
+    """
+    Decodes a column of codes into an ordered Categorical with the labels of a DimensionLookup.
+
+    Args:
+        codes (pd.Series or array-like): Raw codes, for example the 'TravelModes' column of a raw export.
+        lookup (DimensionLookup): Codes and labels of the dimension.
+
+    Returns:
+        pd.Categorical: The labels, ordered like the lookup, unknown and missing codes become NaN.
+
+    Notes:
+        - Only the distinct codes are looked up. Every row then gets its position with one np.take
+          through the factorized codes, no per row dict lookup is done. Categorical codes are not
+          factorized again, only their categories are looked up.
+    """
+
+    if isinstance(getattr(codes, 'dtype', None), pd.CategoricalDtype):
+        # Categorical codes are already factorized
+        codes = pd.Series(codes)
+        row_codes, distinct = codes.cat.codes.to_numpy(), codes.cat.categories
+    else:
+        # Factorize a Series as it is, converting its string array to objects first is slower
+        row_codes, distinct = pd.factorize(codes if isinstance(codes, (pd.Series, pd.Index)) else np.asarray(codes))
+
+    # Position of every distinct code in the lookup, -1 for unknown codes, and -1 again for missing rows
+    positions = np.append(lookup.codes.get_indexer(distinct), -1)
+
+    return pd.Categorical.from_codes(np.take(positions, row_codes), categories=lookup.labels, ordered=True)
+
+
+def _read_sections(file_path):
+
+    """
+    Splits a StatLine metadata file into its sections: per section name the header and the rows.
+    """
+
+    sections = {}
+    name = None
+
+    with open(file_path, encoding='utf-8-sig', newline='') as metadata_file:
+        for row in csv.reader(metadata_file, delimiter=';'):
+            if not row or not any(row):
+                continue
+            # A section starts with a line that only holds its name, the next line is its header
+            if len(row) == 1:
+                name = row[0]
+                sections[name] = None
+            elif sections[name] is None:
+                sections[name] = (row, [])
+            else:
+                sections[name][1].append(dict(zip(sections[name][0], row)))
+
+    return {name: rows for name, (header, rows) in sections.items()}
+
+
+@instrumented
+def read_statline_metadata(file_path):
+
+    """
+    Reads a CBS StatLine metadata file into lookups for every dimension of its table.
+
+    Args:
+        file_path (str): Path to the semicolon separated '<table>_metadata.csv' file, for example
+            'old/84710ENG_metadata.csv'.
+
+    Returns:
+        StatLineMetadata: The table identifier and title, a DimensionLookup per dimension key and per
+            topic key a dict with its 'title', 'unit' and 'group'.
+
+    Notes:
+        - The 'DataProperties' section lists the dimensions and topics of the table, every dimension
+          has its own section of 'Key' and 'Title' rows.
+        - The result is kept per file and modification time, so a session parses every file once.
+    """
+
+    stat = os.stat(file_path)
+    file_id = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+
+    if file_id in _metadata_by_file:
+        return _metadata_by_file[file_id]
+
+    sections = _read_sections(file_path)
+    table_info = sections['TableInfos'][0]
+
+    dimensions = {}
+    topics = {}
+    groups = {}
+
+    for data_property in sections['DataProperties']:
+        kind = data_property['Type']
+        if kind in ('Dimension', 'TimeDimension', 'GeoDimension', 'GeoDetail'):
+            rows = sections[data_property['Key']]
+            dimensions[data_property['Key']] = DimensionLookup(
+                codes=pd.Index([row['Key'] for row in rows]),
+                labels=pd.Index([row['Title'].strip() for row in rows]),
+            )
+        elif kind == 'TopicGroup':
+            groups[data_property['ID']] = data_property['Title'].strip()
+        elif kind == 'Topic':
+            topics[data_property['Key']] = {
+                'title': data_property['Title'].strip(),
+                'unit': data_property.get('Unit', '').strip(),
+                'group': groups.get(data_property['ParentID']),
+            }
+
+    metadata = StatLineMetadata(
+        identifier=table_info['Identifier'],
+        title=table_info['Title'],
+        dimensions=dimensions,
+        topics=topics,
+    )
+    _metadata_by_file[file_id] = metadata
+
+    return metadata
+
+
+@instrumented
+def decode_statline_table(data, metadata, topic_names=None):
+
+    """
+    Decodes a raw StatLine export of any table with the lookups of its metadata.
+
+    Args:
+        data (pd.DataFrame): Raw export, for example read from '84710ENG_TypedDataSet_*.csv'.
+        metadata (StatLineMetadata): Metadata of the same table, from read_statline_metadata.
+        topic_names (dict, optional): New names of the topic columns, for example column_names_mapping.
+
+    Returns:
+        pd.DataFrame: A new DataFrame where every dimension column holds its labels as an ordered
+            Categorical, and every topic column is numeric with '.' and other text as NaN.
+
+    Notes:
+        - Every dimension is decoded with decode_with_lookup, so dozens of CBS tables go through the
+          same vectorised path without hand written maps.
+        - data is not modified.
+    """
+
+    decoded = {}
+
+    for dimension, lookup in metadata.dimensions.items():
+        if dimension in data.columns:
+            decoded[dimension] = decode_with_lookup(data[dimension], lookup)
+
+    for topic in metadata.topics:
+        if topic in data.columns:
+            decoded[topic] = pd.to_numeric(data[topic], errors='coerce')
+
+    table = data.assign(**decoded)
+
+    if topic_names:
+        table = table.rename(columns={topic: name for topic, name in topic_names.items() if topic in metadata.topics})
+
+    return table